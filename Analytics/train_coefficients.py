@@ -0,0 +1,249 @@
+import argparse
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ["temperature", "humidity", "wind_speed", "UVA", "AOD", "sex", "age", "height", "weight", "BMI"]
+TARGETS = ["comfort_temperature", "comfort_humidity", "comfort_wind", "comfort_UVA", "comfort_AOD"]
+SEX_CODES = {"male": 1.0, "female": 0.0, "m": 1.0, "f": 0.0, "1": 1.0, "0": 0.0}
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "coefficient.json")
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class Moments:
+    def __init__(self, width: int):
+        self.n = 0
+        self.mean = np.zeros(width)
+        self.comoment = np.zeros((width, width))
+
+    def update(self, z: np.ndarray) -> None:
+        if not len(z):
+            return
+        chunk = Moments(z.shape[1])
+        chunk.n = len(z)
+        chunk.mean = z.mean(axis=0)
+        centered = z - chunk.mean
+        chunk.comoment = centered.T @ centered
+        self.merge(chunk)
+
+    def merge(self, other: "Moments") -> None:
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment += other.comoment + np.outer(delta, delta) * (self.n * other.n / n)
+        self.mean += delta * (other.n / n)
+        self.n = n
+
+
+class Fit:
+    def __init__(self, train: Moments):
+        k = len(FEATURES)
+        if train.n < 2:
+            raise ValueError("not enough training rows")
+        cov = train.comoment / train.n
+        self.mean = train.mean[:k]
+        self.std = np.sqrt(np.clip(np.diag(cov)[:k], 0.0, None))
+        self.target_mean = train.mean[k:]
+        self.slopes = np.linalg.lstsq(cov[:k, :k], cov[:k, k:], rcond=None)[0]
+        # sklearn LinearRegression on StandardScaler output: beta = b * std, intercept = mean(y)
+        self.coef = self.slopes * self.std[:, None]
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        return self.target_mean + (x - self.mean) @ self.slopes
+
+    def r2(self, test: Moments) -> np.ndarray:
+        k = len(FEATURES)
+        cxx, cxy, cyy = test.comoment[:k, :k], test.comoment[:k, k:], np.diag(test.comoment)[k:]
+        offset = test.mean[k:] - self.predict(test.mean[:k])
+        sse = cyy - 2 * np.einsum("ij,ij->j", self.slopes, cxy) \
+            + np.einsum("ij,ik,kj->j", self.slopes, cxx, self.slopes) + test.n * offset ** 2
+        return 1.0 - sse / np.where(cyy > 0, cyy, np.nan)
+
+
+def _byte_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+    step = max(1, (size - start) // max(1, parts))
+    bounds = [start + i * step for i in range(parts)] + [size]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if lo < hi]
+
+
+def _read_header(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [c.strip() for c in f.readline().split(",")]
+
+
+def _iter_chunks(path: str, start: int, end: int, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+    header = _read_header(path)
+    with open(path, "rb") as f:
+        # A range owns every line that starts inside it.
+        f.seek(start - 1)
+        if f.read(1) != b"\n":
+            f.readline()
+        while True:
+            offsets: List[int] = []
+            buf = io.BytesIO()
+            while len(offsets) < chunk_rows:
+                pos = f.tell()
+                if pos >= end:
+                    break
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    offsets.append(pos)
+                    buf.write(line)
+            if not offsets:
+                return
+            buf.seek(0)
+            df = pd.read_csv(buf, header=None, names=header, usecols=FEATURES + TARGETS,
+                             dtype={"sex": str}, skipinitialspace=True)
+            yield df, np.array(offsets, dtype=np.uint64)
+
+
+def _prepare(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    df = df.copy()
+    df["sex"] = df["sex"].str.strip().str.lower().map(SEX_CODES)
+    z = df[FEATURES + TARGETS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    valid = np.isfinite(z).all(axis=1)
+    return z, valid
+
+
+def _is_holdout(offsets: np.ndarray, holdout: float) -> np.ndarray:
+    if holdout <= 0:
+        return np.zeros(len(offsets), dtype=bool)
+    hashed = (offsets * HASH_MULTIPLIER) >> np.uint64(32)
+    return hashed < np.uint64(holdout * 2 ** 32)
+
+
+def _accumulate(args: Tuple[str, int, int, int, float]) -> Tuple[Moments, Moments, int]:
+    path, start, end, chunk_rows, holdout = args
+    width = len(FEATURES) + len(TARGETS)
+    train, test, dropped = Moments(width), Moments(width), 0
+    for df, offsets in _iter_chunks(path, start, end, chunk_rows):
+        z, valid = _prepare(df)
+        dropped += int((~valid).sum())
+        held = _is_holdout(offsets, holdout)
+        train.update(z[valid & ~held])
+        test.update(z[valid & held])
+    return train, test, dropped
+
+
+def _abs_errors(args: Tuple[str, int, int, int, float, Fit]) -> Tuple[np.ndarray, int]:
+    path, start, end, chunk_rows, holdout, fit = args
+    total, count = np.zeros(len(TARGETS)), 0
+    k = len(FEATURES)
+    for df, offsets in _iter_chunks(path, start, end, chunk_rows):
+        z, valid = _prepare(df)
+        if holdout > 0:
+            valid &= _is_holdout(offsets, holdout)
+        rows = z[valid]
+        if len(rows):
+            pred = fit.predict(rows[:, :k])
+            total += np.abs(pred - rows[:, k:]).sum(axis=0)
+            count += len(rows)
+    return total, count
+
+
+def _run(fn, jobs: List[tuple], workers: int) -> list:
+    if workers <= 1 or len(jobs) <= 1:
+        return [fn(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, jobs))
+
+
+def train(csv_path: str, chunk_rows: int = 200_000, workers: int = 1, holdout: float = 0.2,
+          with_mae: bool = True) -> Dict:
+    ranges = _byte_ranges(csv_path, max(1, workers))
+    width = len(FEATURES) + len(TARGETS)
+    train_m, test_m, dropped = Moments(width), Moments(width), 0
+    for tr, te, dr in _run(_accumulate, [(csv_path, lo, hi, chunk_rows, holdout) for lo, hi in ranges], workers):
+        train_m.merge(tr)
+        test_m.merge(te)
+        dropped += dr
+    logger.info("Accumulated %d training rows, %d holdout rows, dropped %d", train_m.n, test_m.n, dropped)
+
+    fit = Fit(train_m)
+    evaluated = test_m if test_m.n >= 2 else train_m
+    r2 = fit.r2(evaluated)
+    mae: Optional[np.ndarray] = None
+    if with_mae:
+        eval_holdout = holdout if test_m.n >= 2 else 0.0
+        total, count = np.zeros(len(TARGETS)), 0
+        for t, c in _run(_abs_errors, [(csv_path, lo, hi, chunk_rows, eval_holdout, fit) for lo, hi in ranges],
+                         workers):
+            total += t
+            count += c
+        mae = total / max(1, count)
+
+    return build_config(fit, r2, mae, {
+        "source": os.path.basename(csv_path),
+        "rows": int(train_m.n),
+        "holdout_rows": int(test_m.n),
+        "dropped_rows": int(dropped),
+    })
+
+
+def build_config(fit: Fit, r2: np.ndarray, mae: Optional[np.ndarray], training: Dict) -> Dict:
+    formulas = {}
+    for j, target in enumerate(TARGETS):
+        formulas[target] = {
+            "intercept": float(fit.target_mean[j]),
+            "coefficients": {f: float(fit.coef[i, j]) for i, f in enumerate(FEATURES)},
+            "scaling_params": {
+                f: {"mean": float(fit.mean[i]), "std": float(fit.std[i])} for i, f in enumerate(FEATURES)
+            },
+        }
+    digest = hashlib.sha1(json.dumps(formulas, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    accuracy = {"average_r2": float(np.nanmean(r2))}
+    if mae is not None:
+        accuracy = {"average_mae": float(mae.mean()), **accuracy}
+    return {
+        "version": f"{now:%Y%m%dT%H%M%SZ}-{digest}",
+        "trained_at": now.isoformat(timespec="seconds"),
+        "training": training,
+        "columns": FEATURES,
+        "formulas": formulas,
+        "overall_accuracy": accuracy,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fit comfort coefficients from a CSV without loading it into memory.")
+    parser.add_argument("csv_path")
+    parser.add_argument("-o", "--output", action="append",
+                        help=f"where to write coefficient.json (repeatable, default {DEFAULT_OUTPUT})")
+    parser.add_argument("--chunk-rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of rows kept out for R2/MAE")
+    parser.add_argument("--no-mae", action="store_true", help="skip the second pass that measures MAE")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+    config = train(args.csv_path, args.chunk_rows, args.workers, args.holdout, not args.no_mae)
+    for path in args.output or [DEFAULT_OUTPUT]:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        print(f"Wrote {config['version']} to {path}")
+    print(json.dumps(config["overall_accuracy"]))
+
+
+if __name__ == "__main__":
+    main()
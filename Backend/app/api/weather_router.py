@@ -1,16 +1,29 @@
 import os
+import json
 import logging
 from typing import Optional, List
 import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
 from app.clients.openweather_client import OpenWeatherClient
 from app.clients.openmeteo_client import OpenMeteoClient
-from app.services.weather_service import WeatherService
-from app.models.weather_dto import WeatherDTO, ComfortDTO
+from app.deadline import Deadline
+from app.services.weather_service import WeatherService, content_etag
+from app.models.weather_dto import (
+    WeatherDTO, ComfortDTO, ComfortBatchRequestDTO, ComfortBatchItemDTO, ForecastBatchRequestDTO, HistoryDTO,
+    HourlyComfortDTO
+)
 from app.services.comfort_service import Sex
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+FORECAST_BATCH_CONCURRENCY = int(os.getenv("FORECAST_BATCH_CONCURRENCY", "8"))
+FORECAST_BATCH_MAX_CONCURRENCY = int(os.getenv("FORECAST_BATCH_MAX_CONCURRENCY", "32"))
+FORECAST_CACHE_CONTROL = os.getenv("FORECAST_CACHE_CONTROL", "public, no-cache")
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+HISTORY_DEFAULT_DAYS = int(os.getenv("HISTORY_DEFAULT_DAYS", "30"))
+HISTORY_MAX_DAYS = int(os.getenv("HISTORY_MAX_DAYS", "3660"))
+COMFORT_BATCH_MAX_ITEMS = int(os.getenv("COMFORT_BATCH_MAX_ITEMS", "10000"))
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/weather", tags=["Weather"])
@@ -28,13 +41,53 @@ def _parse_sex(value: str) -> Sex:
         return Sex.female
     raise ValueError(f"Unsupported sex value: {value}")
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _conditional_json(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": FORECAST_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/forecast", response_model=List[WeatherDTO])
-def get_weather(city: str, service: WeatherService = Depends(get_weather_service)):
+async def get_weather(city: str, request: Request, service: WeatherService = Depends(get_weather_service)):
     logger.info("Fetching 6-day forecast: city=%s", city)
-    return service.get_weather(city)
+    body, etag = await service.aget_weather_encoded(city, Deadline(REQUEST_DEADLINE_SECONDS))
+    return _conditional_json(request, body, etag)
+
+@router.post("/forecast/batch")
+async def get_weather_batch(request: ForecastBatchRequestDTO,
+                            service: WeatherService = Depends(get_weather_service)):
+    concurrency = min(request.concurrency or FORECAST_BATCH_CONCURRENCY, FORECAST_BATCH_MAX_CONCURRENCY)
+    logger.info("Fetching batch forecast: cities=%d concurrency=%d", len(request.cities), concurrency)
+
+    async def ndjson():
+        async for city, forecast, error in service.astream_weather_many(request.cities, concurrency):
+            item = {"city": city}
+            if error is None:
+                item["forecast"] = [row.model_dump() for row in forecast]
+            else:
+                item["error"] = error
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/diagnostics")
+async def get_diagnostics(request: Request, service: WeatherService = Depends(get_weather_service)):
+    diagnostics = service.diagnostics()
+    prefetch = getattr(request.app.state, "prefetch", None)
+    if prefetch is not None:
+        diagnostics["prefetch"] = prefetch.stats()
+    return diagnostics
 
 @router.get("/comfort", response_model=ComfortDTO)
-def get_comfort(age: float,
+async def get_comfort(request: Request,
+                age: float,
                 weight: float,
                 height: float,
                 sex: str,
@@ -57,4 +110,92 @@ def get_comfort(age: float,
         date = datetime.date.today()
     logger.info("Computing comfort: city=%s date=%s age=%s height=%s weight=%s sex=%s",
                 city, date.isoformat(), age, height, weight, sex_enum.name)
-    return service.get_comfort(age, weight, height, sex_enum, city, date)
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+    comfort = await service.aget_comfort(age, weight, height, sex_enum, city, date, deadline)
+    body = comfort.model_dump_json().encode("utf-8")
+    return _conditional_json(request, body, content_etag(body))
+
+@router.get("/comfort/hourly", response_model=HourlyComfortDTO)
+async def get_hourly_comfort(request: Request,
+                age: float,
+                weight: float,
+                height: float,
+                sex: str,
+                city: str,
+                service: WeatherService = Depends(get_weather_service)):
+    try:
+        sex_enum = _parse_sex(sex)
+    except ValueError as e:
+        logger.error("Invalid sex parameter: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Query param 'sex' must be one of: male, female, 1, 0, m, f"
+        )
+    logger.info("Computing hourly comfort: city=%s age=%s height=%s weight=%s sex=%s",
+                city, age, height, weight, sex_enum.name)
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+    comfort = await service.aget_hourly_comfort(age, weight, height, sex_enum, city, deadline)
+    body = comfort.model_dump_json().encode("utf-8")
+    return _conditional_json(request, body, content_etag(body))
+
+@router.get("/history", response_model=HistoryDTO)
+async def get_history(request: Request,
+                city: str,
+                start: Optional[datetime.date] = None,
+                end: Optional[datetime.date] = None,
+                age: Optional[float] = None,
+                weight: Optional[float] = None,
+                height: Optional[float] = None,
+                sex: Optional[str] = None,
+                include_rows: bool = True,
+                service: WeatherService = Depends(get_weather_service)):
+    end = end or datetime.date.today() - datetime.timedelta(days=1)
+    start = start or end - datetime.timedelta(days=HISTORY_DEFAULT_DAYS - 1)
+    if start > end or (end - start).days >= HISTORY_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"'start' must not be after 'end' and the range must cover at most {HISTORY_MAX_DAYS} days"
+        )
+    profile = None
+    given = [v is not None for v in (age, weight, height, sex)]
+    if any(given):
+        if not all(given):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Comfort history needs all of 'age', 'weight', 'height' and 'sex'"
+            )
+        try:
+            profile = (age, height, weight, _parse_sex(sex))
+        except ValueError as e:
+            logger.error("Invalid sex parameter: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Query param 'sex' must be one of: male, female, 1, 0, m, f"
+            )
+    logger.info("Reading forecast history: city=%s start=%s end=%s comfort=%s", city, start, end, profile is not None)
+    history = await service.ahistory(city, start, end, profile, include_rows)
+    body = history.model_dump_json().encode("utf-8")
+    return _conditional_json(request, body, content_etag(body))
+
+@router.post("/comfort/batch", response_model=List[ComfortBatchItemDTO])
+async def get_comfort_batch(request: ComfortBatchRequestDTO,
+                            service: WeatherService = Depends(get_weather_service)):
+    try:
+        profiles = [(p.age, p.height, p.weight, _parse_sex(p.sex)) for p in request.profiles]
+    except ValueError as e:
+        logger.error("Invalid sex parameter: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Profile field 'sex' must be one of: male, female, 1, 0, m, f"
+        )
+    dates = request.dates or [datetime.date.today()]
+    items = len(request.cities) * len(dates) * len(profiles)
+    if items > COMFORT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"cities x dates x profiles is {items}; "
+                   f"a batch may ask for at most {COMFORT_BATCH_MAX_ITEMS} results"
+        )
+    logger.info("Computing batch comfort: cities=%d dates=%d profiles=%d",
+                len(request.cities), len(dates), len(profiles))
+    return await service.aget_comfort_batch(request.cities, dates, profiles)
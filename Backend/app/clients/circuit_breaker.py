@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import httpx
+
+from app.metrics import CIRCUIT_REJECTED, CIRCUIT_STATE
+
+if TYPE_CHECKING:
+    from app.clients.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+CIRCUIT_PROBE_INTERVAL_SECONDS = float(os.getenv("CIRCUIT_PROBE_INTERVAL_SECONDS", "5"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(httpx.HTTPError):
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} circuit is open, retrying in {retry_in:.0f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_seconds: float = CIRCUIT_RECOVERY_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self.opened = 0
+        self.rejected = 0
+        CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], provider=name)
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self._state, state)
+        self._state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], provider=self.name)
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.recovery_seconds - now)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def probe_due(self) -> bool:
+        with self._lock:
+            return self._state == OPEN and self._retry_in(time.monotonic()) == 0
+
+    def before_call(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._state != CLOSED and self._retry_in(now) == 0:
+                # Also frees trial slots held by calls that never reported back (e.g. cancelled).
+                self._set_state(HALF_OPEN)
+                self._opened_at = now
+                self._trials = 0
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self.rejected += 1
+            retry_in = self._retry_in(now)
+        CIRCUIT_REJECTED.inc(provider=self.name)
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                self._set_state(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_in": round(self._retry_in(time.monotonic()), 1) if self._state == OPEN else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+_breakers_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def provider_setting(provider: str, name: str, default: str) -> str:
+    return os.getenv(f"{provider.upper()}_{name}", default)
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                failure_threshold=int(provider_setting(
+                    provider, "CIRCUIT_FAILURE_THRESHOLD", str(CIRCUIT_FAILURE_THRESHOLD))),
+                recovery_seconds=float(provider_setting(
+                    provider, "CIRCUIT_RECOVERY_SECONDS", str(CIRCUIT_RECOVERY_SECONDS))),
+                half_open_calls=int(provider_setting(
+                    provider, "CIRCUIT_HALF_OPEN_CALLS", str(CIRCUIT_HALF_OPEN_CALLS))),
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.stats() for b in breakers}
+
+
+class CircuitProber:
+    def __init__(
+        self,
+        clients_factory: Callable[[], List["HttpClient"]],
+        interval_seconds: float = CIRCUIT_PROBE_INTERVAL_SECONDS,
+    ):
+        self.clients_factory = clients_factory
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.probes = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="circuit-probe")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.warning("Circuit probe run failed: %s", e)
+
+    async def tick(self) -> int:
+        due = [c for c in self.clients_factory() if get_breaker(c.PROVIDER).probe_due()]
+        for client in due:
+            self.probes += 1
+            try:
+                await client.aprobe()
+                logger.info("Circuit probe for %s succeeded", client.PROVIDER)
+            except httpx.HTTPError as e:
+                logger.info("Circuit probe for %s failed: %s", client.PROVIDER, e)
+        return len(due)
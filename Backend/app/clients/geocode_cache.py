@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.storage.sqlite_store import connect_wal
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+COMMON_CITIES_FILE = BASE_DIR / "common_cities.json"
+
+GEOCODE_DB = os.getenv("GEOCODE_DB_PATH", "geocode_cache.sqlite3")
+GEOCODE_NEGATIVE_TTL_SECONDS = float(os.getenv("GEOCODE_NEGATIVE_TTL_SECONDS", str(24 * 3600)))
+
+Location = Dict[str, Any]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    city TEXT PRIMARY KEY,
+    lat REAL,
+    lon REAL,
+    timezone TEXT,
+    expires_at REAL
+);
+"""
+
+# A negative answer only fills an empty or negative slot, also when another worker stored the positive one.
+_UPSERT = """
+INSERT INTO geocode (city, lat, lon, timezone, expires_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (city) DO UPDATE SET
+    lat = excluded.lat, lon = excluded.lon, timezone = excluded.timezone, expires_at = excluded.expires_at
+WHERE excluded.lat IS NOT NULL OR geocode.lat IS NULL
+"""
+
+
+def normalize_city(city: str) -> str:
+    return " ".join(str(city).casefold().split())
+
+
+class GeocodeCache:
+    def __init__(self, path: Optional[str] = GEOCODE_DB, negative_ttl_seconds: float = GEOCODE_NEGATIVE_TTL_SECONDS):
+        self.path = path
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries: Dict[str, Tuple[Optional[Location], Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._conn = connect_wal(path)
+            with self._lock:
+                self._conn.executescript(_SCHEMA)
+                self._load()
+
+    def _load(self, key: Optional[str] = None) -> None:
+        now = time.time()
+        if key is None:
+            cursor = self._conn.execute("SELECT * FROM geocode")
+        else:
+            cursor = self._conn.execute("SELECT * FROM geocode WHERE city = ?", (key,))
+        for rec in cursor:
+            expires_at = rec["expires_at"]
+            if expires_at is not None and expires_at <= now:
+                continue
+            loc = None
+            if rec["lat"] is not None:
+                loc = {"lat": rec["lat"], "lon": rec["lon"]}
+                if rec["timezone"]:
+                    loc["timezone"] = rec["timezone"]
+            self._entries[rec["city"]] = (loc, expires_at)
+
+    def get(self, city: str) -> Tuple[bool, Optional[Location]]:
+        key = normalize_city(city)
+        with self._lock:
+            if key not in self._entries and self._conn is not None:
+                self._load(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                loc, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self.hits += 1
+                    return True, loc
+                del self._entries[key]
+            self.misses += 1
+        return False, None
+
+    async def aget(self, city: str) -> Tuple[bool, Optional[Location]]:
+        # Only a miss in memory touches SQLite; keep that lookup off the event loop.
+        with self._lock:
+            in_memory = self._conn is None or normalize_city(city) in self._entries
+        if in_memory:
+            return self.get(city)
+        return await asyncio.to_thread(self.get, city)
+
+    def put(self, city: str, loc: Optional[Location]) -> None:
+        key = normalize_city(city)
+        expires_at = None if loc else time.time() + self.negative_ttl_seconds
+        with self._lock:
+            existing = self._entries.get(key)
+            if not loc and existing and existing[0]:
+                # Both providers share this cache; one that cannot find a city must not hide the other's answer.
+                return
+            if loc and existing and existing[0] and "timezone" in existing[0] and "timezone" not in loc:
+                loc = dict(loc, timezone=existing[0]["timezone"])
+            self._entries[key] = (loc, expires_at)
+            if self._conn is not None:
+                self._conn.execute(_UPSERT, (key, loc and loc["lat"], loc and loc["lon"], loc and loc.get("timezone"),
+                                             expires_at))
+                if not loc:
+                    self._load(key)
+
+    def warm(self, path: Path = COMMON_CITIES_FILE) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            cities = json.load(f)
+        added = 0
+        for item in cities:
+            if normalize_city(item["name"]) in self._entries:
+                continue
+            loc = {"lat": float(item["lat"]), "lon": float(item["lon"])}
+            if item.get("timezone"):
+                loc["timezone"] = item["timezone"]
+            self.put(item["name"], loc)
+            added += 1
+        logger.info("Geocode cache warmed with %d of %d bundled cities", added, len(cities))
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_default_lock = threading.Lock()
+_default_cache: Optional[GeocodeCache] = None
+
+
+def get_geocode_cache() -> GeocodeCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = GeocodeCache()
+        return _default_cache
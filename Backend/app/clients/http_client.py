@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.clients.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from app.clients.rate_limiter import Priority, RateLimiter, current_priority, get_limiter, upstream_priority
+from app.deadline import Deadline, DeadlineExceeded, call_timeout
+from app.metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+PROBE_TIMEOUT_SECONDS = float(os.getenv("CIRCUIT_PROBE_TIMEOUT_SECONDS", "5"))
+
+_limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+_sync_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(limits=_limits)
+    return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(limits=_limits)
+    return _async_client
+
+
+async def open_http_clients() -> None:
+    get_async_client()
+
+
+async def close_http_clients() -> None:
+    global _async_client, _sync_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+
+
+def _error_kind(error: Optional[BaseException], status_code: int = 0) -> str:
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if error is not None:
+        return "transport"
+    return "http_5xx" if status_code >= 500 else "http_4xx"
+
+
+def _is_outage(response: Optional[httpx.Response], error: Optional[BaseException]) -> bool:
+    if error is not None:
+        return True
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+class HttpClient(ABC):
+    PROVIDER = "http"
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return get_breaker(self.PROVIDER)
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return get_limiter(self.PROVIDER)
+
+    @abstractmethod
+    def _probe_request(self) -> Tuple[str, Dict[str, Any]]:
+        ...
+
+    def _call_cost(self, params: Dict[str, Any]) -> float:
+        return 1.0
+
+    def _enter_circuit(self, cost: float, deadline: Optional[Deadline], timeout: float) -> float:
+        try:
+            effective = call_timeout(deadline, timeout)
+            self.breaker.before_call()
+        except (CircuitOpenError, DeadlineExceeded):
+            # Nothing was sent, so the quota token goes back.
+            self.limiter.refund(cost)
+            raise
+        return effective
+
+    async def _aenter_circuit(self, cost: float, deadline: Optional[Deadline], timeout: float) -> float:
+        try:
+            effective = call_timeout(deadline, timeout)
+            self.breaker.before_call()
+        except (CircuitOpenError, DeadlineExceeded):
+            await self.limiter.arefund(cost)
+            raise
+        return effective
+
+    def _record(self, stage: str, started: float, response: Optional[httpx.Response],
+                error: Optional[BaseException] = None, budget_limited: bool = False) -> None:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, provider=self.PROVIDER, stage=stage)
+        if error is not None or (response is not None and response.status_code >= 400):
+            kind = _error_kind(error, response.status_code if response is not None else 0)
+            UPSTREAM_ERRORS.inc(provider=self.PROVIDER, stage=stage, kind=kind)
+        if budget_limited:
+            # Our own budget ran out before the provider's normal timeout; not evidence of an outage.
+            return
+        if _is_outage(response, error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _failed(self, stage: str, started: float, error: httpx.HTTPError, timeout: float, default: float) -> None:
+        budget_limited = isinstance(error, httpx.TimeoutException) and timeout < default
+        self._record(stage, started, None, error, budget_limited)
+        if budget_limited:
+            raise DeadlineExceeded(f"{self.PROVIDER} {stage} did not finish within the request deadline") from error
+
+    def _get(self, url: str, params: Dict[str, Any], timeout: float, stage: str = "request",
+             deadline: Optional[Deadline] = None) -> httpx.Response:
+        cost = self._call_cost(params)
+        self.limiter.acquire(current_priority(), deadline, cost)
+        effective = self._enter_circuit(cost, deadline, timeout)
+        started = time.perf_counter()
+        try:
+            r = get_sync_client().get(url, params=params, timeout=effective)
+        except httpx.HTTPError as e:
+            self._failed(stage, started, e, effective, timeout)
+            raise
+        self._record(stage, started, r)
+        if r.status_code == 429:
+            self.limiter.throttled()
+        return r
+
+    async def _aget(self, url: str, params: Dict[str, Any], timeout: float, stage: str = "request",
+                    deadline: Optional[Deadline] = None) -> httpx.Response:
+        cost = self._call_cost(params)
+        await self.limiter.aacquire(current_priority(), deadline, cost)
+        effective = await self._aenter_circuit(cost, deadline, timeout)
+        started = time.perf_counter()
+        try:
+            r = await get_async_client().get(url, params=params, timeout=effective)
+        except httpx.HTTPError as e:
+            self._failed(stage, started, e, effective, timeout)
+            raise
+        self._record(stage, started, r)
+        if r.status_code == 429:
+            await self.limiter.athrottled()
+        return r
+
+    def _get_json(self, url: str, params: Dict[str, Any], timeout: float, stage: str = "request",
+                  deadline: Optional[Deadline] = None) -> Any:
+        r = self._get(url, params, timeout, stage, deadline)
+        r.raise_for_status()
+        return r.json()
+
+    async def _aget_json(self, url: str, params: Dict[str, Any], timeout: float, stage: str = "request",
+                         deadline: Optional[Deadline] = None) -> Any:
+        r = await self._aget(url, params, timeout, stage, deadline)
+        r.raise_for_status()
+        return r.json()
+
+    async def aprobe(self) -> None:
+        url, params = self._probe_request()
+        with upstream_priority(Priority.PREFETCH):
+            await self._aget_json(url, params, PROBE_TIMEOUT_SECONDS, stage="probe")
@@ -1,27 +1,91 @@
-import requests
-from typing import List, Dict, Any, Optional
-
-class OpenMeteoClient:
-    GEO_URL = "https://geocoding-api.open-meteo.com/v1/search"
-    FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
-    AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
-
-    def _geocode(self, city: str) -> Optional[Dict[str, float]]:
-        resp = requests.get(self.GEO_URL, params={"name": city, "count": 1, "language": "en", "format": "json"}, timeout=15)
-        resp.raise_for_status()
-        js = resp.json()
+import os
+import asyncio
+import datetime
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.clients.geocode_cache import GeocodeCache, get_geocode_cache
+from app.clients.http_client import HttpClient
+from app.clients.rate_limiter import RateLimitedError
+from app.deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+HOURLY_VARIABLES = {
+    "temperature": "temperature_2m",
+    "humidity": "relative_humidity_2m",
+    "windspeed": "wind_speed_10m",
+    "uv_index": "uv_index",
+}
+
+class OpenMeteoClient(HttpClient):
+    GEO_URL = os.getenv("OPENMETEO_GEO_URL", "https://geocoding-api.open-meteo.com/v1/search")
+    FORECAST_URL = os.getenv("OPENMETEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+    AIR_QUALITY_URL = os.getenv("OPENMETEO_AIR_QUALITY_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+    PROVIDER = "openmeteo"
+    BATCH_SIZE = int(os.getenv("OPENMETEO_BATCH_SIZE", "50"))
+
+    def __init__(self, geocode_cache: Optional[GeocodeCache] = None):
+        self.geocode_cache = geocode_cache or get_geocode_cache()
+
+    @staticmethod
+    def _geocode_params(city: str) -> Dict[str, Any]:
+        return {"name": city, "count": 1, "language": "en", "format": "json"}
+
+    def _probe_request(self) -> Tuple[str, Dict[str, Any]]:
+        return self.GEO_URL, self._geocode_params("London")
+
+    def _call_cost(self, params: Dict[str, Any]) -> float:
+        # Open-Meteo counts every location of a multi-location request against the quota.
+        return float(str(params.get("latitude", "")).count(",") + 1)
+
+    @staticmethod
+    def _parse_geocode(js: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         if not js.get("results"):
             return None
         first = js["results"][0]
-        return {"lat": first["latitude"], "lon": first["longitude"]}
+        loc = {"lat": first["latitude"], "lon": first["longitude"]}
+        if first.get("timezone"):
+            loc["timezone"] = first["timezone"]
+        return loc
+
+    def _geocode(self, city: str) -> Optional[Dict[str, Any]]:
+        hit, loc = self.geocode_cache.get(city)
+        if hit:
+            return loc
+        js = self._get_json(self.GEO_URL, self._geocode_params(city), timeout=15, stage="geocode")
+        loc = self._parse_geocode(js)
+        self.geocode_cache.put(city, loc)
+        return loc
+
+    async def aresolve(self, city: str) -> Optional[Dict[str, Any]]:
+        return await self._ageocode(city)
+
+    async def _ageocode(self, city: str, deadline: Optional[Deadline] = None) -> Optional[Dict[str, Any]]:
+        hit, loc = await self.geocode_cache.aget(city)
+        if hit:
+            return loc
+        js = await self._aget_json(self.GEO_URL, self._geocode_params(city), timeout=15, stage="geocode",
+                                   deadline=deadline)
+        loc = self._parse_geocode(js)
+        await asyncio.to_thread(self.geocode_cache.put, city, loc)
+        return loc
 
-    def _fetch_daily(self, lat: float, lon: float, days: int) -> Dict[str, Any]:
-        params = {
+    @staticmethod
+    def _span(days: int, start_date: Optional[str], end_date: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        if start_date and end_date:
+            days = (datetime.date.fromisoformat(end_date) - datetime.date.fromisoformat(start_date)).days + 1
+            return days, {"start_date": start_date, "end_date": end_date}
+        return days, {"forecast_days": days}
+
+    @staticmethod
+    def _daily_params(lat: float, lon: float, span: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "latitude": lat,
             "longitude": lon,
             "timezone": "auto",
             "wind_speed_unit": "ms",
-            "forecast_days": days,
+            **span,
             "daily": ",".join([
                 "temperature_2m_mean",
                 "relative_humidity_2m_mean",
@@ -31,27 +95,103 @@ class OpenMeteoClient:
                 "cloud_cover_mean",
             ]),
         }
-        r = requests.get(self.FORECAST_URL, params=params, timeout=20)
-        r.raise_for_status()
-        return r.json()
 
-    def _fetch_aod_hourly(self, lat: float, lon: float) -> Dict[str, Any]:
-        params = {
+    def _fetch_daily(self, lat: float, lon: float, span: Dict[str, Any]) -> Dict[str, Any]:
+        return self._get_json(self.FORECAST_URL, self._daily_params(lat, lon, span), timeout=20, stage="daily")
+
+    async def _afetch_daily(self, lat: float, lon: float, span: Dict[str, Any],
+                            deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        return await self._aget_json(self.FORECAST_URL, self._daily_params(lat, lon, span), timeout=20, stage="daily",
+                                     deadline=deadline)
+
+    @staticmethod
+    def _aod_params(lat: float, lon: float, span: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "latitude": lat,
             "longitude": lon,
             "timezone": "auto",
             "hourly": "aerosol_optical_depth",
+            **span,
         }
-        r = requests.get(self.AIR_QUALITY_URL, params=params, timeout=20)
-        r.raise_for_status()
-        return r.json()
 
-    def get_weather(self, city: str, days: int = 6) -> List[Dict[str, Any]]:
+    def _fetch_aod_hourly(self, lat: float, lon: float, span: Dict[str, Any]) -> Dict[str, Any]:
+        return self._get_json(self.AIR_QUALITY_URL, self._aod_params(lat, lon, span), timeout=20, stage="aod")
+
+    async def _afetch_aod_hourly(self, lat: float, lon: float, span: Dict[str, Any],
+                                 deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        return await self._aget_json(self.AIR_QUALITY_URL, self._aod_params(lat, lon, span), timeout=20, stage="aod",
+                                     deadline=deadline)
+
+    @staticmethod
+    def _hourly_params(lat: float, lon: float, span: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "latitude": lat,
+            "longitude": lon,
+            "timezone": "auto",
+            "wind_speed_unit": "ms",
+            **span,
+            "hourly": ",".join(HOURLY_VARIABLES.values()),
+        }
+
+    def _fetch_hourly(self, lat: float, lon: float, span: Dict[str, Any]) -> Dict[str, Any]:
+        return self._get_json(self.FORECAST_URL, self._hourly_params(lat, lon, span), timeout=20, stage="hourly")
+
+    async def _afetch_hourly(self, lat: float, lon: float, span: Dict[str, Any],
+                             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        return await self._aget_json(self.FORECAST_URL, self._hourly_params(lat, lon, span), timeout=20,
+                                     stage="hourly", deadline=deadline)
+
+    @staticmethod
+    def _build_hourly(js: Dict[str, Any], aq: Any) -> Dict[str, Any]:
+        hourly = js.get("hourly", {}) or {}
+        times = hourly.get("time", []) or []
+        out: Dict[str, Any] = {"timezone": js.get("timezone"), "time": times}
+        for key, variable in HOURLY_VARIABLES.items():
+            values = hourly.get(variable) or []
+            out[key] = [values[i] if i < len(values) else None for i in range(len(times))]
+        out["aod"] = [None] * len(times)
+        if isinstance(aq, dict):
+            aq_hourly = aq.get("hourly", {}) or {}
+            by_time = dict(zip(aq_hourly.get("time", []) or [], aq_hourly.get("aerosol_optical_depth", []) or []))
+            out["aod"] = [by_time.get(t) for t in times]
+        return out
+
+    def get_hourly(self, city: str, days: int = 6) -> Optional[Dict[str, Any]]:
         loc = self._geocode(city)
         if not loc:
-            return []
+            return None
+        _, span = self._span(days, None, None)
+        js = self._fetch_hourly(loc["lat"], loc["lon"], span)
+        try:
+            aq: Any = self._fetch_aod_hourly(loc["lat"], loc["lon"], span)
+        except Exception as e:
+            logger.debug("Open-Meteo hourly AOD fetch failed for city=%s: %s", city, e)
+            aq = e
+        return self._build_hourly(js, aq)
 
-        daily = self._fetch_daily(loc["lat"], loc["lon"], days)
+    async def aget_hourly(
+        self,
+        city: str,
+        days: int = 6,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[Dict[str, Any]]:
+        loc = await self._ageocode(city, deadline)
+        if not loc:
+            return None
+        _, span = self._span(days, None, None)
+        js, aq = await asyncio.gather(
+            self._afetch_hourly(loc["lat"], loc["lon"], span, deadline),
+            self._afetch_aod_hourly(loc["lat"], loc["lon"], span, deadline),
+            return_exceptions=True,
+        )
+        if isinstance(js, BaseException):
+            raise js
+        if isinstance(aq, BaseException):
+            logger.debug("Open-Meteo hourly AOD fetch failed for city=%s: %s", city, aq)
+        return self._build_hourly(js, aq)
+
+    @staticmethod
+    def _build_rows(daily: Dict[str, Any], days: int) -> List[Dict[str, Any]]:
         time_arr = daily.get("daily", {}).get("time", []) or []
 
         out: List[Dict[str, Any]] = []
@@ -66,20 +206,155 @@ class OpenMeteoClient:
                 "cloudcover": float((daily["daily"].get("cloud_cover_mean") or [None])[i] or 0.0),
                 "aod": 0.0,
             })
+        return out
 
+    @staticmethod
+    def _skip_aod(out: List[Dict[str, Any]]) -> None:
+        # No AOD at all is not the same as AOD 0: the merge marks these rows partial so they get refetched.
+        for item in out:
+            item["aod"] = None
+
+    @staticmethod
+    def _apply_aod(out: List[Dict[str, Any]], aq: Dict[str, Any]) -> None:
+        t_hours = aq.get("hourly", {}).get("time", []) or []
+        aod_hours = aq.get("hourly", {}).get("aerosol_optical_depth", []) or []
+        buckets: Dict[str, List[float]] = {}
+        for t_str, aod_val in zip(t_hours, aod_hours):
+            d_str = t_str.split("T", 1)[0]
+            buckets.setdefault(d_str, []).append(float(aod_val or 0.0))
+        for item in out:
+            day = item["date"]
+            if day in buckets and buckets[day]:
+                item["aod"] = sum(buckets[day]) / len(buckets[day])
+
+    def get_weather(
+        self,
+        city: str,
+        days: int = 6,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        loc = self._geocode(city)
+        if not loc:
+            return []
+
+        days, span = self._span(days, start_date, end_date)
+        out = self._build_rows(self._fetch_daily(loc["lat"], loc["lon"], span), days)
         try:
-            aq = self._fetch_aod_hourly(loc["lat"], loc["lon"])
-            t_hours = aq.get("hourly", {}).get("time", []) or []
-            aod_hours = aq.get("hourly", {}).get("aerosol_optical_depth", []) or []
-            buckets: Dict[str, List[float]] = {}
-            for t_str, aod_val in zip(t_hours, aod_hours):
-                d_str = t_str.split("T", 1)[0]
-                buckets.setdefault(d_str, []).append(float(aod_val or 0.0))
-            for item in out:
-                day = item["date"]
-                if day in buckets and buckets[day]:
-                    item["aod"] = sum(buckets[day]) / len(buckets[day])
+            self._apply_aod(out, self._fetch_aod_hourly(loc["lat"], loc["lon"], span))
+        except RateLimitedError as e:
+            logger.info("Open-Meteo AOD skipped for city=%s (%s); returning rows without AOD", city, e)
+            self._skip_aod(out)
         except Exception:
             pass
 
         return out
+
+    async def aget_weather(
+        self,
+        city: str,
+        days: int = 6,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Dict[str, Any]]:
+        loc = await self._ageocode(city, deadline)
+        if not loc:
+            return []
+
+        days, span = self._span(days, start_date, end_date)
+        daily, aq = await asyncio.gather(
+            self._afetch_daily(loc["lat"], loc["lon"], span, deadline),
+            self._afetch_aod_hourly(loc["lat"], loc["lon"], span, deadline),
+            return_exceptions=True,
+        )
+        if isinstance(daily, BaseException):
+            raise daily
+        out = self._build_rows(daily, days)
+        if isinstance(aq, (DeadlineExceeded, RateLimitedError)):
+            logger.info("Open-Meteo AOD skipped for city=%s (%s); returning rows without AOD", city, aq)
+            self._skip_aod(out)
+        elif isinstance(aq, BaseException):
+            logger.debug("Open-Meteo AOD fetch failed for city=%s: %s", city, aq)
+        else:
+            try:
+                self._apply_aod(out, aq)
+            except Exception:
+                pass
+
+        return out
+
+    @staticmethod
+    def _coords(locations: List[Dict[str, Any]]) -> Tuple[str, str]:
+        return ",".join(str(loc["lat"]) for loc in locations), ",".join(str(loc["lon"]) for loc in locations)
+
+    @staticmethod
+    def _split(js: Any, n: int) -> List[Dict[str, Any]]:
+        items = js if isinstance(js, list) else [js]
+        if len(items) != n:
+            raise ValueError(f"Open-Meteo returned {len(items)} locations, expected {n}")
+        return items
+
+    def _chunks(self, locations: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        size = max(1, self.BATCH_SIZE)
+        return [locations[i:i + size] for i in range(0, len(locations), size)]
+
+    def _build_many(self, chunk: List[Dict[str, Any]], daily: Any, aq: Any, days: int) -> List[List[Dict[str, Any]]]:
+        out = [self._build_rows(d, days) for d in self._split(daily, len(chunk))]
+        if isinstance(aq, (DeadlineExceeded, RateLimitedError)):
+            logger.info("Open-Meteo batch AOD skipped for %d locations (%s); returning rows without AOD",
+                        len(chunk), aq)
+            for rows in out:
+                self._skip_aod(rows)
+            return out
+        if isinstance(aq, BaseException):
+            logger.debug("Open-Meteo batch AOD fetch failed for %d locations: %s", len(chunk), aq)
+            return out
+        try:
+            for rows, aq_item in zip(out, self._split(aq, len(chunk))):
+                self._apply_aod(rows, aq_item)
+        except Exception:
+            pass
+        return out
+
+    def get_weather_many(
+        self,
+        locations: List[Dict[str, Any]],
+        days: int = 6,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        days, span = self._span(days, start_date, end_date)
+        out: List[List[Dict[str, Any]]] = []
+        for chunk in self._chunks(locations):
+            lat, lon = self._coords(chunk)
+            daily = self._fetch_daily(lat, lon, span)
+            try:
+                aq = self._fetch_aod_hourly(lat, lon, span)
+            except Exception as e:
+                aq = e
+            out.extend(self._build_many(chunk, daily, aq, days))
+        return out
+
+    async def aget_weather_many(
+        self,
+        locations: List[Dict[str, Any]],
+        days: int = 6,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        days, span = self._span(days, start_date, end_date)
+
+        async def fetch_chunk(chunk: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+            lat, lon = self._coords(chunk)
+            daily, aq = await asyncio.gather(
+                self._afetch_daily(lat, lon, span),
+                self._afetch_aod_hourly(lat, lon, span),
+                return_exceptions=True,
+            )
+            if isinstance(daily, BaseException):
+                raise daily
+            return self._build_many(chunk, daily, aq, days)
+
+        chunks = await asyncio.gather(*(fetch_chunk(chunk) for chunk in self._chunks(locations)))
+        return [rows for chunk_rows in chunks for rows in chunk_rows]
@@ -1,61 +1,172 @@
-import requests
+import os
+import httpx
+import asyncio
 import logging
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.clients.circuit_breaker import CircuitOpenError
+from app.clients.geocode_cache import GeocodeCache, get_geocode_cache
+from app.clients.http_client import HttpClient
+from app.clients.rate_limiter import RateLimitedError
+from app.deadline import Deadline, DeadlineExceeded
+from app.metrics import OPENWEATHER_FALLBACKS
 
 logger = logging.getLogger(__name__)
 
-class OpenWeatherClient:
-    GEO_URL = "https://api.openweathermap.org/geo/1.0/direct"
-    ONECALL_URLS = [
-        "https://api.openweathermap.org/data/3.0/onecall",
-        "https://api.openweathermap.org/data/2.5/onecall",
-    ]
+ENDPOINT_MEMORY_SECONDS = float(os.getenv("OPENWEATHER_ENDPOINT_MEMORY_SECONDS", str(6 * 3600)))
+
+_endpoint_lock = threading.Lock()
+_working_endpoints: Dict[str, Tuple[str, float]] = {}
+
+class OpenWeatherClient(HttpClient):
+    PROVIDER = "openweather"
+    GEO_URL = os.getenv("OPENWEATHER_GEO_URL", "https://api.openweathermap.org/geo/1.0/direct")
+    ONECALL_URLS = os.getenv(
+        "OPENWEATHER_ONECALL_URLS",
+        "https://api.openweathermap.org/data/3.0/onecall,https://api.openweathermap.org/data/2.5/onecall",
+    ).split(",")
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, geocode_cache: Optional[GeocodeCache] = None):
         self.api_key = api_key
+        self.geocode_cache = geocode_cache or get_geocode_cache()
 
-    def _geocode(self, city: str) -> Optional[Dict[str, float]]:
-        r = requests.get(self.GEO_URL, params={"q": city, "limit": 1, "appid": self.api_key}, timeout=15)
-        r.raise_for_status()
-        js = r.json()
+    def _geocode_params(self, city: str) -> Dict[str, Any]:
+        return {"q": city, "limit": 1, "appid": self.api_key}
+
+    @staticmethod
+    def _parse_geocode(js: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
         if not js:
             return None
         first = js[0]
         return {"lat": first["lat"], "lon": first["lon"]}
 
-    def _onecall_daily(self, lat: float, lon: float) -> Dict[str, Any]:
-        params = {
+    def _geocode(self, city: str) -> Optional[Dict[str, Any]]:
+        hit, loc = self.geocode_cache.get(city)
+        if hit:
+            return loc
+        js = self._get_json(self.GEO_URL, self._geocode_params(city), timeout=15, stage="geocode")
+        loc = self._parse_geocode(js)
+        self.geocode_cache.put(city, loc)
+        return loc
+
+    async def _ageocode(self, city: str, deadline: Optional[Deadline] = None) -> Optional[Dict[str, Any]]:
+        hit, loc = await self.geocode_cache.aget(city)
+        if hit:
+            return loc
+        js = await self._aget_json(self.GEO_URL, self._geocode_params(city), timeout=15, stage="geocode",
+                                   deadline=deadline)
+        loc = self._parse_geocode(js)
+        await asyncio.to_thread(self.geocode_cache.put, city, loc)
+        return loc
+
+    def _probe_request(self) -> Tuple[str, Dict[str, Any]]:
+        return self.GEO_URL, self._geocode_params("London")
+
+    def _onecall_params(self, lat: float, lon: float) -> Dict[str, Any]:
+        return {
             "lat": lat,
             "lon": lon,
             "exclude": "current,minutely,hourly,alerts",
             "units": "metric",
             "appid": self.api_key,
         }
+
+    def _count_fallback(self, url: str, reason: str) -> None:
+        if url != self.ONECALL_URLS[-1]:
+            OPENWEATHER_FALLBACKS.inc(reason=reason)
+
+    def _onecall_urls(self) -> List[str]:
+        with _endpoint_lock:
+            remembered = _working_endpoints.get(self.api_key)
+        if remembered is None:
+            return list(self.ONECALL_URLS)
+        url, remembered_at = remembered
+        if url not in self.ONECALL_URLS or time.monotonic() - remembered_at > ENDPOINT_MEMORY_SECONDS:
+            return list(self.ONECALL_URLS)
+        return [url] + [u for u in self.ONECALL_URLS if u != url]
+
+    def _remember_endpoint(self, url: str) -> None:
+        with _endpoint_lock:
+            previous = _working_endpoints.get(self.api_key)
+            _working_endpoints[self.api_key] = (url, time.monotonic())
+        if previous is None or previous[0] != url:
+            logger.info("OpenWeather key works with %s; trying it first from now on", url)
+
+    def _forget_endpoint(self, url: str) -> None:
+        with _endpoint_lock:
+            if _working_endpoints.get(self.api_key, ("",))[0] == url:
+                del _working_endpoints[self.api_key]
+
+    def _onecall_result(self, url: str, r: httpx.Response) -> Optional[Dict[str, Any]]:
+        if r.status_code in (401, 403):
+            logger.warning("OpenWeather unauthorized (%s) for %s — trying next fallback (if any)", r.status_code, url)
+            self._forget_endpoint(url)
+            self._count_fallback(url, str(r.status_code))
+            raise httpx.HTTPStatusError(f"{r.status_code} Unauthorized/Forbidden", request=r.request, response=r)
+        r.raise_for_status()
+        self._remember_endpoint(url)
+        return r.json()
+
+    def _onecall_daily(self, lat: float, lon: float) -> Dict[str, Any]:
+        params = self._onecall_params(lat, lon)
         last_err = None
-        for url in self.ONECALL_URLS:
+        for url in self._onecall_urls():
             try:
-                r = requests.get(url, params=params, timeout=20)
-                if r.status_code in (401, 403):
-                    logger.warning("OpenWeather unauthorized (%s) for %s — trying next fallback (if any)", r.status_code, url)
-                    last_err = requests.HTTPError(f"{r.status_code} Unauthorized/Forbidden")
-                    continue
-                r.raise_for_status()
-                return r.json()
-            except requests.RequestException as e:
+                return self._onecall_result(url, self._get(url, params, timeout=20, stage="onecall"))
+            except RateLimitedError:
+                raise
+            except CircuitOpenError as e:
+                last_err = e
+                break
+            except httpx.HTTPStatusError as e:
+                last_err = e
+                if e.response.status_code not in (401, 403):
+                    logger.warning("OpenWeather request failed for %s: %s", url, e)
+                    self._count_fallback(url, type(e).__name__)
+            except httpx.HTTPError as e:
                 logger.warning("OpenWeather request failed for %s: %s", url, e)
                 last_err = e
-                continue
+                self._count_fallback(url, type(e).__name__)
         if last_err:
             logger.warning("OpenWeather failed completely, using only Open-Meteo data. Reason: %s", last_err)
         return {}
 
-    def get_weather(self, city: str, days: int = 6) -> List[Dict[str, Any]]:
-        loc = self._geocode(city)
-        if not loc:
-            return []
+    async def _aonecall_daily(self, lat: float, lon: float, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        params = self._onecall_params(lat, lon)
+        last_err = None
+        for url in self._onecall_urls():
+            try:
+                return self._onecall_result(
+                    url, await self._aget(url, params, timeout=20, stage="onecall", deadline=deadline)
+                )
+            except (DeadlineExceeded, RateLimitedError):
+                raise
+            except CircuitOpenError as e:
+                last_err = e
+                break
+            except httpx.HTTPStatusError as e:
+                last_err = e
+                if e.response.status_code not in (401, 403):
+                    logger.warning("OpenWeather request failed for %s: %s", url, e)
+                    self._count_fallback(url, type(e).__name__)
+            except httpx.HTTPError as e:
+                logger.warning("OpenWeather request failed for %s: %s", url, e)
+                last_err = e
+                self._count_fallback(url, type(e).__name__)
+        if last_err:
+            logger.warning("OpenWeather failed completely, using only Open-Meteo data. Reason: %s", last_err)
+        return {}
 
-        data = self._onecall_daily(loc["lat"], loc["lon"])
+    @staticmethod
+    def _build_rows(
+        data: Dict[str, Any],
+        days: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
         if not data or "daily" not in data:
             return []
 
@@ -63,10 +174,15 @@ class OpenWeatherClient:
         tz = timezone(timedelta(seconds=tz_offset))
         out: List[Dict[str, Any]] = []
 
-        for d in (data.get("daily") or [])[:days]:
-            dt_local = datetime.fromtimestamp(int(d["dt"]), tz=tz)
+        daily = data.get("daily") or []
+        if not (start_date and end_date):
+            daily = daily[:days]
+        for d in daily:
+            date = datetime.fromtimestamp(int(d["dt"]), tz=tz).date().isoformat()
+            if start_date and end_date and not start_date <= date <= end_date:
+                continue
             out.append({
-                "date": dt_local.date().isoformat(),
+                "date": date,
                 "temperature": float(d.get("temp", {}).get("day", 0.0)),
                 "humidity": float(d.get("humidity", 0.0)),
                 "windspeed": float(d.get("wind_speed", 0.0)),
@@ -77,3 +193,29 @@ class OpenWeatherClient:
             })
 
         return out
+
+    def get_weather(
+        self,
+        city: str,
+        days: int = 6,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        loc = self._geocode(city)
+        if not loc:
+            return []
+        return self._build_rows(self._onecall_daily(loc["lat"], loc["lon"]), days, start_date, end_date)
+
+    async def aget_weather(
+        self,
+        city: str,
+        days: int = 6,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Dict[str, Any]]:
+        loc = await self._ageocode(city, deadline)
+        if not loc:
+            return []
+        data = await self._aonecall_daily(loc["lat"], loc["lon"], deadline)
+        return self._build_rows(data, days, start_date, end_date)
@@ -0,0 +1,356 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.clients.circuit_breaker import provider_setting
+from app.deadline import DEADLINE_MIN_CALL_SECONDS, Deadline
+from app.metrics import RATE_LIMIT_HEADROOM, RATE_LIMIT_SHED, RATE_LIMIT_WAIT_SECONDS
+from app.storage.sqlite_store import connect_wal
+
+logger = logging.getLogger(__name__)
+
+# Free-tier limits: Open-Meteo 600/min and 10000/day, OpenWeather 60/min and 1000/day (One Call 3.0).
+_PROVIDER_LIMITS = {"openmeteo": (600, 10000), "openweather": (60, 1000)}
+RATE_LIMIT_RESERVE_FRACTION = float(os.getenv("RATE_LIMIT_RESERVE_FRACTION", "0.2"))
+RATE_LIMIT_USER_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_USER_MAX_WAIT_SECONDS", "5"))
+RATE_LIMIT_BATCH_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_BATCH_MAX_WAIT_SECONDS", "2"))
+RATE_LIMIT_PREFETCH_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_PREFETCH_MAX_WAIT_SECONDS", "0"))
+RATE_LIMIT_POLL_SECONDS = float(os.getenv("RATE_LIMIT_POLL_SECONDS", "0.05"))
+# Bucket levels live here so every worker process spends from the same quota; empty keeps them per process.
+# Kept apart from the forecast DB so long write-behind and archive transactions never hold the limiter up.
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB_PATH", "rate_limit.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit (
+    provider TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (provider, bucket)
+) WITHOUT ROWID;
+"""
+
+
+class Priority(IntEnum):
+    USER = 0
+    BATCH = 1
+    PREFETCH = 2
+
+
+_MAX_WAIT = {
+    Priority.USER: RATE_LIMIT_USER_MAX_WAIT_SECONDS,
+    Priority.BATCH: RATE_LIMIT_BATCH_MAX_WAIT_SECONDS,
+    Priority.PREFETCH: RATE_LIMIT_PREFETCH_MAX_WAIT_SECONDS,
+}
+
+_priority: ContextVar[Priority] = ContextVar("upstream_priority", default=Priority.USER)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+@contextmanager
+def upstream_priority(priority: Priority) -> Iterator[None]:
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimitedError(httpx.HTTPError):
+    def __init__(self, provider: str, retry_in: float, priority: Priority):
+        super().__init__(
+            f"{provider} request quota exhausted for {priority.name.lower()} calls, retrying in {retry_in:.0f}s"
+        )
+        self.provider = provider
+        self.retry_in = retry_in
+        self.priority = priority
+
+
+class TokenBucket:
+    def __init__(self, name: str, capacity: float, period_seconds: float):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period_seconds
+        self.tokens = capacity
+        self.updated_at = time.time()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = max(self.updated_at, now)
+
+    def wait_seconds(self, cost: float, floor: float, now: float) -> float:
+        self._refill(now)
+        # A call costing more than the bucket holds waits for a full bucket and then runs it into debt.
+        short = min(cost + floor, self.capacity) - self.tokens
+        return short / self.rate if short > 0 else 0.0
+
+    def take(self, cost: float) -> None:
+        self.tokens -= cost
+
+    def give_back(self, cost: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class SharedBuckets:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect_wal(path)
+        self._conn.executescript(_SCHEMA)
+
+    def _load(self, provider: str, buckets: List[TokenBucket]) -> None:
+        for rec in self._conn.execute(
+                "SELECT bucket, tokens, updated_at FROM rate_limit WHERE provider = ?", (provider,)):
+            for bucket in buckets:
+                if bucket.name == rec["bucket"]:
+                    bucket.tokens, bucket.updated_at = rec["tokens"], rec["updated_at"]
+
+    def read(self, provider: str, buckets: List[TokenBucket]) -> None:
+        # WAL readers never wait for the write lock, so this is safe to call from the event loop.
+        with self._lock:
+            try:
+                self._load(provider, buckets)
+            except sqlite3.Error as e:
+                logger.warning("Shared rate limit state unavailable, showing this process's buckets: %s", e)
+
+    @contextmanager
+    def syncing(self, provider: str, buckets: List[TokenBucket]) -> Iterator[None]:
+        # Load the current levels, let the caller spend, write them back, all under one SQLite write lock.
+        # This blocks on other workers, so async callers run it through asyncio.to_thread.
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._load(provider, buckets)
+            except sqlite3.Error as e:
+                logger.warning("Shared rate limit state unavailable, using this process's buckets: %s", e)
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                yield
+                return
+            try:
+                yield
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit (provider, bucket, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                    [(provider, b.name, b.tokens, b.updated_at) for b in buckets],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+@contextmanager
+def _local_only() -> Iterator[None]:
+    yield
+
+
+class RateLimiter:
+    # Calls wait in (priority, arrival) order and only the best-placed waiter may take tokens. Everything but
+    # user-facing calls must also leave a reserve in each bucket, so background work runs out of quota first.
+    def __init__(self, name: str, per_minute: float, per_day: float,
+                 reserve_fraction: float = RATE_LIMIT_RESERVE_FRACTION, shared: Optional[SharedBuckets] = None):
+        self.name = name
+        self.shared = shared
+        self.reserve_fraction = min(max(reserve_fraction, 0.0), 0.9)
+        windows = (("minute", per_minute, 60.0), ("day", per_day, 86400.0))
+        self.buckets = [TokenBucket(w, limit, period) for w, limit, period in windows if limit > 0]
+        self._lock = threading.Lock()
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self.granted = 0
+        self.deferred = 0
+        self.shed = 0
+
+    def _syncing(self) -> ContextManager[None]:
+        return self.shared.syncing(self.name, self.buckets) if self.shared is not None else _local_only()
+
+    def _floor(self, bucket: TokenBucket, priority: Priority) -> float:
+        return 0.0 if priority == Priority.USER else bucket.capacity * self.reserve_fraction
+
+    def _admit(self, ticket: Tuple[int, int], cost: float, now: float) -> float:
+        # Returns 0 once the call has its tokens, otherwise the estimated seconds until it could.
+        ahead = sum(1 for t in self._waiting if t < ticket)
+        priority = Priority(ticket[0])
+        wait = max((b.wait_seconds(cost * (ahead + 1), self._floor(b, priority), now) for b in self.buckets),
+                   default=0.0)
+        if ahead:
+            return max(wait, RATE_LIMIT_POLL_SECONDS)
+        if wait == 0:
+            for bucket in self.buckets:
+                bucket.take(cost)
+        return wait
+
+    def _max_wait(self, priority: Priority, deadline: Optional[Deadline]) -> float:
+        max_wait = _MAX_WAIT[priority]
+        if deadline is not None:
+            max_wait = min(max_wait, deadline.remaining() - DEADLINE_MIN_CALL_SECONDS)
+        return max_wait
+
+    def _leave(self, ticket: Tuple[int, int]) -> None:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+
+    def _step(self, ticket: Tuple[int, int], cost: float, give_up_at: float, queued: bool) -> float:
+        now = time.time()
+        with self._lock, self._syncing():
+            wait = self._admit(ticket, cost, now)
+            if wait == 0:
+                self._leave(ticket)
+                self.granted += 1
+                self.deferred += queued
+                self._report()
+                return 0.0
+            if now + wait > give_up_at:
+                self._leave(ticket)
+                self.shed += 1
+                priority = Priority(ticket[0])
+                RATE_LIMIT_SHED.inc(provider=self.name, priority=priority.name.lower())
+                raise RateLimitedError(self.name, wait, priority)
+            if not queued:
+                heapq.heappush(self._waiting, ticket)
+        return min(wait, RATE_LIMIT_POLL_SECONDS * 10)
+
+    def acquire(self, priority: Priority, deadline: Optional[Deadline] = None, cost: float = 1.0) -> None:
+        if not self.buckets:
+            return
+        ticket = (int(priority), next(self._seq))
+        started = time.monotonic()
+        give_up_at = time.time() + self._max_wait(priority, deadline)
+        queued = False
+        try:
+            while True:
+                sleep = self._step(ticket, cost, give_up_at, queued)
+                if sleep == 0:
+                    break
+                queued = True
+                time.sleep(sleep)
+        finally:
+            with self._lock:
+                self._leave(ticket)
+        RATE_LIMIT_WAIT_SECONDS.observe(time.monotonic() - started, provider=self.name, priority=priority.name.lower())
+
+    async def aacquire(self, priority: Priority, deadline: Optional[Deadline] = None, cost: float = 1.0) -> None:
+        if not self.buckets:
+            return
+        ticket = (int(priority), next(self._seq))
+        started = time.monotonic()
+        give_up_at = time.time() + self._max_wait(priority, deadline)
+        queued = False
+        try:
+            while True:
+                sleep = await self._off_loop(self._step, ticket, cost, give_up_at, queued)
+                if sleep == 0:
+                    break
+                queued = True
+                await asyncio.sleep(sleep)
+        finally:
+            with self._lock:
+                self._leave(ticket)
+        RATE_LIMIT_WAIT_SECONDS.observe(time.monotonic() - started, provider=self.name, priority=priority.name.lower())
+
+    async def _off_loop(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.shared is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    def refund(self, cost: float = 1.0) -> None:
+        with self._lock, self._syncing():
+            for bucket in self.buckets:
+                bucket.give_back(cost)
+            self._report()
+
+    def throttled(self) -> None:
+        # The provider answered 429: its window is tighter than ours, so stop spending until the bucket refills.
+        with self._lock, self._syncing():
+            for bucket in self.buckets:
+                if bucket.name == "minute":
+                    bucket.tokens = min(bucket.tokens, 0.0)
+            self._report()
+        logger.warning("%s answered 429; pausing calls until the per-minute budget refills", self.name)
+
+    async def arefund(self, cost: float = 1.0) -> None:
+        await self._off_loop(self.refund, cost)
+
+    async def athrottled(self) -> None:
+        await self._off_loop(self.throttled)
+
+    def _report(self) -> None:
+        for bucket in self.buckets:
+            RATE_LIMIT_HEADROOM.set(max(0.0, bucket.tokens), provider=self.name, window=bucket.name)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            if self.shared is not None:
+                self.shared.read(self.name, self.buckets)
+            windows = {}
+            for bucket in self.buckets:
+                bucket._refill(now)
+                windows[bucket.name] = {
+                    "limit": bucket.capacity,
+                    "available": round(max(0.0, bucket.tokens), 1),
+                    "background_available": round(max(0.0, bucket.tokens - self._floor(bucket, Priority.PREFETCH)), 1),
+                }
+        return {
+            "windows": windows,
+            "shared": self.shared is not None,
+            "waiting": len(self._waiting),
+            "granted": self.granted,
+            "deferred": self.deferred,
+            "shed": self.shed,
+        }
+
+
+_limiters_lock = threading.Lock()
+_limiters: Dict[str, RateLimiter] = {}
+_shared: Optional[SharedBuckets] = None
+
+
+def _shared_buckets() -> Optional[SharedBuckets]:
+    global _shared
+    if _shared is None and RATE_LIMIT_DB:
+        try:
+            _shared = SharedBuckets(RATE_LIMIT_DB)
+        except sqlite3.Error as e:
+            logger.warning("Cannot open shared rate limit state at %s; limits apply per process: %s", RATE_LIMIT_DB, e)
+    return _shared
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            per_minute, per_day = _PROVIDER_LIMITS.get(provider, (0, 0))
+            per_minute = float(provider_setting(provider, "RATE_LIMIT_PER_MINUTE", str(per_minute)))
+            per_day = float(provider_setting(provider, "RATE_LIMIT_PER_DAY", str(per_day)))
+            limiter = RateLimiter(
+                provider,
+                per_minute=per_minute,
+                per_day=per_day,
+                reserve_fraction=float(provider_setting(
+                    provider, "RATE_LIMIT_RESERVE_FRACTION", str(RATE_LIMIT_RESERVE_FRACTION))),
+                shared=_shared_buckets() if per_minute > 0 or per_day > 0 else None,
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
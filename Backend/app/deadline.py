@@ -0,0 +1,37 @@
+import os
+import time
+from typing import Optional
+
+import httpx
+
+DEADLINE_MIN_CALL_SECONDS = float(os.getenv("DEADLINE_MIN_CALL_SECONDS", "0.05"))
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    def __init__(self, message: str = "request deadline exceeded"):
+        super().__init__(message)
+
+
+class Deadline:
+    def __init__(self, seconds: float, expires_at: Optional[float] = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if expires_at is None else expires_at
+
+    def shortened(self, reserve_seconds: float) -> "Deadline":
+        return Deadline(self.seconds, self.expires_at - reserve_seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() < DEADLINE_MIN_CALL_SECONDS
+
+    def timeout(self, default: float) -> float:
+        remaining = self.remaining()
+        if remaining < DEADLINE_MIN_CALL_SECONDS:
+            raise DeadlineExceeded(f"request deadline of {self.seconds:g}s exceeded")
+        return min(default, remaining)
+
+
+def call_timeout(deadline: Optional[Deadline], default: float) -> float:
+    return default if deadline is None else deadline.timeout(default)
@@ -3,8 +3,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import logging
-from fastapi import FastAPI
-from app.api.weather_router import router as weather_router
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.weather_router import router as weather_router, get_weather_service
+from app.clients.circuit_breaker import CircuitOpenError, CircuitProber
+from app.clients.rate_limiter import RateLimitedError
+from app.deadline import DeadlineExceeded
+from app.clients.http_client import open_http_clients, close_http_clients
+from app.clients.geocode_cache import get_geocode_cache
+from app.metrics import REGISTRY, HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, CallbackGauge
+from app.services.prefetch import PrefetchScheduler, PREFETCH_ENABLED
+from app.services.weather_service import CITY_POPULARITY, FORECAST_CACHE, FORECAST_FRESH_SECONDS, REFRESH_FLIGHTS
 
 
 logging.basicConfig(
@@ -13,9 +24,82 @@ logging.basicConfig(
     force=True,
 )
 
-app = FastAPI(title="Weather API with SOLID")
+def _provider_clients():
+    service = get_weather_service()
+    return [service.openmeteo_client, service.openweather_client]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_http_clients()
+    get_geocode_cache().warm()
+    app.state.prefetch = PrefetchScheduler(get_weather_service, CITY_POPULARITY, FORECAST_FRESH_SECONDS)
+    if PREFETCH_ENABLED:
+        app.state.prefetch.start()
+    app.state.circuit_prober = CircuitProber(_provider_clients)
+    app.state.circuit_prober.start()
+    yield
+    await app.state.circuit_prober.stop()
+    await app.state.prefetch.stop()
+    await close_http_clients()
+
+app = FastAPI(title="Weather API with SOLID", lifespan=lifespan)
 
 app.include_router(weather_router)
+
+REGISTRY.register(CallbackGauge(
+    "weather_forecast_cache_entries", "Rows held in the in-memory forecast cache.",
+    lambda: FORECAST_CACHE.stats()["size"]))
+REGISTRY.register(CallbackGauge(
+    "weather_refresh_in_flight", "Upstream refreshes currently running.",
+    lambda: REFRESH_FLIGHTS.stats()["in_flight"]))
+
+_route_paths = set()
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.provider} is temporarily unavailable"},
+        headers={"Retry-After": str(max(1, int(exc.retry_in + 0.5)))},
+    )
+
+
+@app.exception_handler(RateLimitedError)
+async def rate_limited(request: Request, exc: RateLimitedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.provider} request quota is exhausted"},
+        headers={"Retry-After": str(max(1, int(exc.retry_in + 0.5)))},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    if not _route_paths:
+        _route_paths.update(getattr(route, "path", "") for route in app.routes)
+    path = request.url.path if request.url.path in _route_paths else "other"
+    HTTP_IN_FLIGHT.inc(path=path)
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec(path=path)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, path=path, method=request.method, status=status)
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Weather API працює! Використовуй /weather/forecast?city=Kyiv"}
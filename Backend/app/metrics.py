@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, TypeVar
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class CallbackGauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float]):
+        super().__init__(name, help_text)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return self._header() + [f"{self.name} {_format_value(value)}"]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def time(self, **labels: str) -> _Timer:
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(counts), total[0])) for k, (counts, total) in self._values.items())
+        lines = self._header()
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: M) -> M:
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "weather_http_requests_in_flight", "Requests currently being handled.", ["path"]))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "weather_http_request_duration_seconds", "Time to produce a response, by route.", ["path", "method", "status"]))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "weather_upstream_request_duration_seconds", "Upstream provider call latency.", ["provider", "stage"]))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "weather_upstream_errors_total", "Failed upstream provider calls.", ["provider", "stage", "kind"]))
+OPENWEATHER_FALLBACKS = REGISTRY.register(Counter(
+    "weather_openweather_fallback_total", "OpenWeather One Call fallbacks to the next API version.", ["reason"]))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "weather_stage_duration_seconds", "Latency of internal processing stages.", ["stage"]))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "weather_cache_requests_total", "Cache lookups by endpoint and result.", ["endpoint", "result"]))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "weather_circuit_state", "Provider circuit state (0 closed, 1 half-open, 2 open).", ["provider"]))
+CIRCUIT_REJECTED = REGISTRY.register(Counter(
+    "weather_circuit_rejected_total", "Upstream calls skipped because the provider circuit was open.", ["provider"]))
+RATE_LIMIT_HEADROOM = REGISTRY.register(Gauge(
+    "weather_rate_limit_headroom", "Upstream calls left in each provider quota window.", ["provider", "window"]))
+RATE_LIMIT_SHED = REGISTRY.register(Counter(
+    "weather_rate_limit_shed_total", "Upstream calls refused because the provider quota ran out.",
+    ["provider", "priority"]))
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "weather_rate_limit_wait_seconds", "Time upstream calls spent queued for provider quota.",
+    ["provider", "priority"]))
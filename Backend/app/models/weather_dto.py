@@ -1,5 +1,12 @@
-from pydantic import BaseModel
-from typing import Dict, Optional
+import datetime
+import os
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+FORECAST_BATCH_MAX_CITIES = int(os.getenv("FORECAST_BATCH_MAX_CITIES", "200"))
+COMFORT_BATCH_MAX_CITIES = int(os.getenv("COMFORT_BATCH_MAX_CITIES", "100"))
+COMFORT_BATCH_MAX_DATES = int(os.getenv("COMFORT_BATCH_MAX_DATES", "16"))
+COMFORT_BATCH_MAX_PROFILES = int(os.getenv("COMFORT_BATCH_MAX_PROFILES", "100"))
 
 class WeatherDTO(BaseModel):
     date: Optional[str] = None
@@ -10,6 +17,7 @@ class WeatherDTO(BaseModel):
     uv_index: int
     cloudcover: float
     aod: float
+    partial: bool = False
 
 class ComfortDTO(BaseModel):
     temperature: float
@@ -20,3 +28,49 @@ class ComfortDTO(BaseModel):
     simple_avg: float = 0.0
     weighted_avg: float = 0.0
     advice: Dict[str, str] = {}
+
+class HourlyComfortDTO(BaseModel):
+    city: str
+    timezone: Optional[str] = None
+    partial: bool = False
+    time: List[str] = []
+    temperature: List[Optional[float]] = []
+    humidity: List[Optional[float]] = []
+    wind_speed: List[Optional[float]] = []
+    uva: List[Optional[float]] = []
+    aod: List[Optional[float]] = []
+    simple_avg: List[Optional[float]] = []
+    weighted_avg: List[Optional[float]] = []
+
+class HistoryDTO(BaseModel):
+    city: str
+    start: str
+    end: str
+    days: int
+    date: List[str] = []
+    columns: Dict[str, List[Optional[float]]] = {}
+    aggregates: Dict[str, Optional[float]] = {}
+    comfort_mean: Optional[Dict[str, Optional[float]]] = None
+    comfort_daily: Optional[List[Optional[float]]] = None
+
+class ForecastBatchRequestDTO(BaseModel):
+    cities: List[str] = Field(min_length=1, max_length=FORECAST_BATCH_MAX_CITIES)
+    concurrency: Optional[int] = Field(default=None, ge=1)
+
+class ComfortProfileDTO(BaseModel):
+    age: float
+    weight: float
+    height: float
+    sex: str
+
+class ComfortBatchRequestDTO(BaseModel):
+    cities: List[str] = Field(min_length=1, max_length=COMFORT_BATCH_MAX_CITIES)
+    dates: List[datetime.date] = Field(default=[], max_length=COMFORT_BATCH_MAX_DATES)
+    profiles: List[ComfortProfileDTO] = Field(min_length=1, max_length=COMFORT_BATCH_MAX_PROFILES)
+
+class ComfortBatchItemDTO(BaseModel):
+    city: str
+    date: str
+    profile_index: int
+    comfort: Optional[ComfortDTO] = None
+    error: Optional[str] = None
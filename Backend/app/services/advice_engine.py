@@ -0,0 +1,141 @@
+import hashlib
+import json
+import math
+import operator
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+# advice key -> (forecast row field, multiplier); wind rules are written in km/h, rows hold m/s
+METRIC_INPUTS: Dict[str, Tuple[str, float]] = {
+    "aod": ("aod", 1.0),
+    "uv": ("uv_index", 1.0),
+    "humidity": ("humidity", 1.0),
+    "wind": ("windspeed", 3.6),
+    "temperature": ("temperature", 1.0),
+}
+
+
+class RuleTable:
+    __slots__ = ("thresholds", "texts", "interval_idx", "point_idx")
+
+    def __init__(self, rules: Sequence[Tuple[Callable[[float, float], bool], float, str]]):
+        thresholds = sorted({value for _, value, _ in rules})
+        texts: List[str] = []
+        text_idx: Dict[str, int] = {}
+
+        def first_match(v: float) -> int:
+            for op, value, text in rules:
+                if op(v, value):
+                    if text not in text_idx:
+                        text_idx[text] = len(texts)
+                        texts.append(text)
+                    return text_idx[text]
+            return -1
+
+        if thresholds:
+            probes = [thresholds[0] - 1.0]
+            probes += [(lo + hi) / 2.0 for lo, hi in zip(thresholds, thresholds[1:])]
+            probes.append(thresholds[-1] + 1.0)
+        else:
+            probes = [0.0]
+        self.thresholds = np.array(thresholds, dtype=float)
+        self.interval_idx = np.array([first_match(v) for v in probes], dtype=np.int64)
+        self.point_idx = np.array([first_match(v) for v in thresholds], dtype=np.int64)
+        self.texts = texts
+
+    def lookup(self, value: float) -> Optional[str]:
+        if math.isnan(value):
+            return None
+        i = bisect_left(self.thresholds, value)
+        if i < len(self.thresholds) and self.thresholds[i] == value:
+            idx = self.point_idx[i]
+        else:
+            idx = self.interval_idx[i]
+        return self.texts[idx] if idx >= 0 else None
+
+    def lookup_many(self, values: np.ndarray) -> np.ndarray:
+        i = np.searchsorted(self.thresholds, values, side="left")
+        idx = self.interval_idx[i]
+        if len(self.thresholds):
+            inside = i < len(self.thresholds)
+            on_point = np.zeros(len(values), dtype=bool)
+            on_point[inside] = self.thresholds[i[inside]] == values[inside]
+            idx = np.where(on_point, self.point_idx[np.minimum(i, len(self.thresholds) - 1)], idx)
+        return np.where(np.isnan(values), -1, idx)
+
+
+class AdviceRules:
+    def __init__(self, config: Dict[str, Any], version: str = ""):
+        self.version = version
+        if not isinstance(config, dict):
+            raise ValueError("advice rules must be an object keyed by metric")
+        unknown = set(config) - set(METRIC_INPUTS)
+        if unknown:
+            raise ValueError(f"unknown advice metrics: {', '.join(sorted(unknown))}")
+
+        self.tables: Dict[str, RuleTable] = {}
+        for metric in METRIC_INPUTS:
+            rules = config.get(metric, [])
+            if not isinstance(rules, list):
+                raise ValueError(f"{metric}: rules must be a list")
+            compiled = []
+            for i, r in enumerate(rules):
+                if not isinstance(r, dict):
+                    raise ValueError(f"{metric}[{i}]: rule must be an object")
+                op = OPERATORS.get(r.get("operator"))
+                if op is None:
+                    raise ValueError(f"{metric}[{i}]: unsupported operator {r.get('operator')!r}")
+                try:
+                    value = float(r.get("value"))
+                except (TypeError, ValueError):
+                    raise ValueError(f"{metric}[{i}]: value must be a number, got {r.get('value')!r}")
+                if not math.isfinite(value):
+                    raise ValueError(f"{metric}[{i}]: value must be finite")
+                text = r.get("text", "")
+                if not isinstance(text, str):
+                    raise ValueError(f"{metric}[{i}]: text must be a string")
+                if text:
+                    compiled.append((op, value, text))
+            self.tables[metric] = RuleTable(compiled)
+
+    @classmethod
+    def load(cls, path: Path) -> "AdviceRules":
+        raw = Path(path).read_bytes()
+        return cls(json.loads(raw), hashlib.sha1(raw).hexdigest()[:12])
+
+    @staticmethod
+    def _value(row: Dict[str, Any], metric: str) -> float:
+        field, scale = METRIC_INPUTS[metric]
+        return float(row.get(field, 0.0)) * scale
+
+    def advise(self, row: Dict[str, Any]) -> Dict[str, str]:
+        adv: Dict[str, str] = {}
+        for metric, table in self.tables.items():
+            text = table.lookup(self._value(row, metric))
+            if text:
+                adv[metric] = text
+        return adv
+
+    def advise_many(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
+        out: List[Dict[str, str]] = [{} for _ in rows]
+        if not rows:
+            return out
+        for metric, table in self.tables.items():
+            if not table.texts:
+                continue
+            values = np.array([self._value(row, metric) for row in rows], dtype=float)
+            for i, idx in enumerate(table.lookup_many(values).tolist()):
+                if idx >= 0:
+                    out[i][metric] = table.texts[idx]
+        return out
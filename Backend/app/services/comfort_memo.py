@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from app.models.weather_dto import ComfortDTO
+
+Profile = Tuple[float, float, float, int]
+MemoKey = Tuple[str, str, Profile]
+RowKey = Tuple[str, str]
+
+
+class ComfortMemo:
+    def __init__(
+        self,
+        max_entries: int = 20000,
+        age_step: float = 1.0,
+        height_step: float = 1.0,
+        weight_step: float = 0.5,
+    ):
+        self.max_entries = max_entries
+        self.steps = (age_step, height_step, weight_step)
+        self._entries: "OrderedDict[MemoKey, Tuple[Hashable, ComfortDTO]]" = OrderedDict()
+        self._by_row: Dict[RowKey, Set[Profile]] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _quantize_value(value: float, step: float) -> float:
+        if step <= 0:
+            return float(value)
+        return round(round(float(value) / step) * step, 6)
+
+    def quantize(self, age: float, height: float, weight: float, sex_value: int) -> Profile:
+        age_step, height_step, weight_step = self.steps
+        return (
+            self._quantize_value(age, age_step),
+            self._quantize_value(height, height_step),
+            self._quantize_value(weight, weight_step),
+            int(sex_value),
+        )
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def get(self, city_key: str, date: str, profile: Profile, version: Hashable) -> Optional[ComfortDTO]:
+        key = (city_key, date, profile)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, city_key: str, date: str, profile: Profile, version: Hashable,
+            comfort: ComfortDTO, epoch: int) -> None:
+        row_key = (city_key, date)
+        key = (city_key, date, profile)
+        with self._lock:
+            # Some row changed while this result was being computed.
+            if self._epoch != epoch:
+                return
+            self._entries[key] = (version, comfort)
+            self._entries.move_to_end(key)
+            self._by_row.setdefault(row_key, set()).add(profile)
+            while len(self._entries) > self.max_entries:
+                (c, d, p), _ = self._entries.popitem(last=False)
+                profiles = self._by_row.get((c, d))
+                if profiles is not None:
+                    profiles.discard(p)
+                    if not profiles:
+                        del self._by_row[(c, d)]
+
+    def invalidate(self, city_key: str, dates: Iterable[str]) -> None:
+        with self._lock:
+            self._epoch += 1
+            for d in dates:
+                row_key = (city_key, d)
+                for profile in self._by_row.pop(row_key, ()):
+                    self._entries.pop((city_key, d, profile), None)
+                    self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,99 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+FEATURES = ("temperature", "humidity", "wind_speed", "UVA", "AOD", "sex", "age", "height", "weight", "BMI")
+WEATHER_FEATURES = FEATURES[:5]
+COMFORT_FORMULAS = (
+    ("temperature", "comfort_temperature"),
+    ("humidity", "comfort_humidity"),
+    ("wind_speed", "comfort_wind"),
+    ("uva", "comfort_UVA"),
+    ("aod", "comfort_AOD"),
+)
+OUTPUTS = tuple(key for key, _ in COMFORT_FORMULAS) + ("simple_avg", "weighted_avg")
+WEIGHT_FORMULA = "comfort_temperature"
+
+
+class ComfortModel:
+    __slots__ = ("version", "config", "coef", "intercept", "mean", "std", "weights", "_w", "_b")
+
+    def __init__(self, config: Dict[str, Any], version: str):
+        formulas = config.get("formulas")
+        if not isinstance(formulas, dict):
+            raise ValueError("coefficient file has no 'formulas' object")
+
+        n_formulas, n_features = len(COMFORT_FORMULAS), len(FEATURES)
+        coef = np.zeros((n_formulas, n_features))
+        intercept = np.zeros(n_formulas)
+        mean = np.zeros((n_formulas, n_features))
+        std = np.ones((n_formulas, n_features))
+        for i, (_, name) in enumerate(COMFORT_FORMULAS):
+            formula = formulas.get(name)
+            if formula is None:
+                continue
+            intercept[i] = float(formula.get("intercept", 0.0))
+            coefficients = formula.get("coefficients", {})
+            scaling = formula.get("scaling_params", {})
+            for j, k in enumerate(FEATURES):
+                coef[i, j] = float(coefficients.get(k, 0.0))
+                mean[i, j] = float(scaling.get(k, {}).get("mean", 0.0))
+                std[i, j] = float(scaling.get(k, {}).get("std", 1.0))
+
+        reference = formulas.get(WEIGHT_FORMULA, {}).get("coefficients", {})
+        weights = np.abs([float(reference.get(k, 0.0)) for k in WEATHER_FEATURES])
+
+        # (x - mean) / std . coef + intercept folded into x . w + b; zero std drops the feature.
+        safe_std = np.where(std != 0, std, 1.0)
+        w = np.where(std != 0, coef / safe_std, 0.0)
+        b = intercept - (w * mean).sum(axis=1)
+
+        self.version = version
+        self.config = config
+        self.coef = coef
+        self.intercept = intercept
+        self.mean = mean
+        self.std = std
+        self.weights = weights / (weights.sum() or 1.0)
+        self._w = np.ascontiguousarray(w.T)
+        self._b = b
+
+    @classmethod
+    def load(cls, path: Path) -> "ComfortModel":
+        raw = Path(path).read_bytes()
+        return cls(json.loads(raw), hashlib.sha1(raw).hexdigest()[:12])
+
+    @staticmethod
+    def profile_features(age: float, height: float, weight: float, sex_value: float) -> np.ndarray:
+        height_m = height / 100.0 if height else 0.0
+        bmi = (weight / (height_m ** 2)) if height_m else 0.0
+        return np.array([float(sex_value), float(age), float(height), float(weight), float(bmi)])
+
+    @staticmethod
+    def weather_features(weather_forecast: Dict[str, Any]) -> np.ndarray:
+        return np.array([
+            float(weather_forecast.get("temperature", 0.0) or 0.0),
+            float(weather_forecast.get("humidity", 0.0) or 0.0),
+            float(weather_forecast.get("windspeed", 0.0) or 0.0),
+            float(weather_forecast.get("uv_index", 0.0) or 0.0),
+            float(weather_forecast.get("aod", 0.0) or 0.0),
+        ])
+
+    def evaluate(self, x: np.ndarray) -> np.ndarray:
+        values = np.clip(x @ self._w + self._b, 0.0, 1.0)
+        out = np.empty(values.shape[:-1] + (len(OUTPUTS),))
+        out[..., :len(COMFORT_FORMULAS)] = values
+        out[..., -2] = values.mean(axis=-1)
+        out[..., -1] = values @ self.weights
+        return out
+
+    def evaluate_grid(self, weather: Sequence[np.ndarray], profiles: Sequence[np.ndarray]) -> np.ndarray:
+        w = np.asarray(weather, dtype=float).reshape(-1, len(WEATHER_FEATURES))
+        p = np.asarray(profiles, dtype=float).reshape(-1, len(FEATURES) - len(WEATHER_FEATURES))
+        x = np.empty((len(w), len(p), len(FEATURES)))
+        x[:, :, :len(WEATHER_FEATURES)] = w[:, None, :]
+        x[:, :, len(WEATHER_FEATURES):] = p[None, :, :]
+        return self.evaluate(x)
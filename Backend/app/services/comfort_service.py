@@ -1,24 +1,32 @@
 from enum import Enum
 from pathlib import Path
-import json
-from typing import Dict
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
 
 from app.models.weather_dto import ComfortDTO
+from app.services.advice_engine import AdviceRules
+from app.services.comfort_model import FEATURES, WEATHER_FEATURES, ComfortModel
+from app.services.hot_reload import HotReloadingFile
 
 BASE_DIR = Path(__file__).resolve().parent
 COEFFICIENTS_FILE = BASE_DIR / "coefficient.json"
 ADVICE_RULES_FILE = BASE_DIR / "advice_rules.json"
+RELOAD_CHECK_SECONDS = float(os.getenv("COMFORT_RELOAD_CHECK_SECONDS", "2.0"))
+
+COMFORT_MODEL = HotReloadingFile(COEFFICIENTS_FILE, ComfortModel.load, RELOAD_CHECK_SECONDS)
 
-def _load_json(path: Path, default: dict) -> dict:
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
+def get_comfort_model() -> ComfortModel:
+    return COMFORT_MODEL.get()
 
-COEFFICIENTS = _load_json(COEFFICIENTS_FILE, {"formulas": {}})
+ADVICE_RULES = HotReloadingFile(ADVICE_RULES_FILE, AdviceRules.load, RELOAD_CHECK_SECONDS)
 
-ADVICE_RULES = _load_json(ADVICE_RULES_FILE, {"aod": [], "uv": [], "humidity": [], "wind": [], "temperature": []})
+def get_advice_rules() -> AdviceRules:
+    return ADVICE_RULES.get()
+
+def comfort_version() -> Tuple[str, str]:
+    return get_comfort_model().version, get_advice_rules().version
 
 class Sex(Enum):
     female = 0
@@ -40,9 +48,10 @@ class Metrics:
 class ComfortService:
     @staticmethod
     def calculation(metrics: dict, formula_name: str) -> float:
-        if formula_name not in COEFFICIENTS.get("formulas", {}):
+        formulas = get_comfort_model().config.get("formulas", {})
+        if formula_name not in formulas:
             return 0.0
-        formula = COEFFICIENTS["formulas"][formula_name]
+        formula = formulas[formula_name]
         result = float(formula.get("intercept", 0.0))
         for key, metric in metrics.items():
             coef = float(formula.get("coefficients", {}).get(key, 0.0))
@@ -51,102 +60,54 @@ class ComfortService:
 
     @staticmethod
     def _advices_from_rules(weather_forecast: dict) -> Dict[str, str]:
-        adv: Dict[str, str] = {}
-
-        aod = float(weather_forecast.get("aod", 0.0))
-        uv = float(weather_forecast.get("uv_index", 0.0))
-        humidity = float(weather_forecast.get("humidity", 0.0))
-        wind_ms = float(weather_forecast.get("windspeed", 0.0))
-        wind_kmh = wind_ms * 3.6
-        temperature = float(weather_forecast.get("temperature", 0.0))
-
-        def apply(metric_key: str, value: float):
-            rules = ADVICE_RULES.get(metric_key, [])
-            for r in rules:
-                op = r.get("operator")
-                threshold = float(r.get("value", 0.0))
-                text = str(r.get("text", ""))
-                ok = False
-                if op == ">":
-                    ok = value > threshold
-                elif op == "<":
-                    ok = value < threshold
-                elif op == ">=":
-                    ok = value >= threshold
-                elif op == "<=":
-                    ok = value <= threshold
-                elif op == "==":
-                    ok = value == threshold
-                if ok and text:
-                    adv[metric_key] = text
-                    break
-
-        apply("aod", aod)
-        apply("uv", uv)
-        apply("humidity", humidity)
-        apply("wind", wind_kmh)
-        apply("temperature", temperature)
-
-        return adv
+        return get_advice_rules().advise(weather_forecast)
 
     @staticmethod
-    def get_comfort(weather_forecast: dict, age: float, height: float, weight: float, sex: Sex) -> ComfortDTO:
-        height_m = height / 100.0 if height else 0.0
-        BMI = (weight / (height_m ** 2)) if height_m else 0.0
-
-        reference_formula = "comfort_temperature"
-        scaling = COEFFICIENTS.get("formulas", {}).get(reference_formula, {}).get("scaling_params", {})
-        coefficients = COEFFICIENTS.get("formulas", {}).get(reference_formula, {}).get("coefficients", {})
-
-        def S(k, default_mean=0.0, default_std=1.0):
-            s = scaling.get(k, {})
-            return float(s.get("mean", default_mean)), float(s.get("std", default_std))
-
-        def C(k):
-            return float(coefficients.get(k, 0.0))
-
-        metrics = {
-            "temperature": Metrics(float(weather_forecast.get("temperature", 0.0)), *S("temperature"), C("temperature")),
-            "humidity":    Metrics(float(weather_forecast.get("humidity", 0.0)),    *S("humidity"),    C("humidity")),
-            "wind_speed":  Metrics(float(weather_forecast.get("windspeed", 0.0)),   *S("wind_speed"),  C("wind_speed")),
-            "UVA":         Metrics(float(weather_forecast.get("uv_index", 0.0)),    *S("UVA"),         C("UVA")),
-            "AOD":         Metrics(float(weather_forecast.get("aod", 0.0)),         *S("AOD"),         C("AOD")),
-            "sex":         Metrics(float(sex.value),                                 *S("sex"),         C("sex")),
-            "age":         Metrics(float(age),                                       *S("age"),         C("age")),
-            "height":      Metrics(float(height),                                    *S("height"),      C("height")),
-            "weight":      Metrics(float(weight),                                    *S("weight"),      C("weight")),
-            "BMI":         Metrics(float(BMI),                                       *S("BMI"),         C("BMI")),
-        }
-
-        comfort_values = {
-            "temperature": max(0.0, min(1.0, ComfortService.calculation(metrics, "comfort_temperature"))),
-            "humidity":    max(0.0, min(1.0, ComfortService.calculation(metrics, "comfort_humidity"))),
-            "wind_speed":  max(0.0, min(1.0, ComfortService.calculation(metrics, "comfort_wind"))),
-            "uva":         max(0.0, min(1.0, ComfortService.calculation(metrics, "comfort_UVA"))),
-            "aod":         max(0.0, min(1.0, ComfortService.calculation(metrics, "comfort_AOD"))),
-        }
-
-        simple_avg = sum(comfort_values.values()) / len(comfort_values)
-
-        weight_keys = ["temperature", "humidity", "wind_speed", "UVA", "AOD"]
-        total_w = sum(abs(metrics[k].coef) for k in weight_keys) or 1.0
-        weighted_avg = (
-            comfort_values["temperature"] * abs(metrics["temperature"].coef) +
-            comfort_values["humidity"]    * abs(metrics["humidity"].coef) +
-            comfort_values["wind_speed"]  * abs(metrics["wind_speed"].coef) +
-            comfort_values["uva"]         * abs(metrics["UVA"].coef) +
-            comfort_values["aod"]         * abs(metrics["AOD"].coef)
-        ) / total_w
-
-        advice = ComfortService._advices_from_rules(weather_forecast)
-
+    def _to_dto(values: Sequence[float], advice: Dict[str, str]) -> ComfortDTO:
         return ComfortDTO(
-            temperature=comfort_values["temperature"],
-            humidity=comfort_values["humidity"],
-            wind_speed=comfort_values["wind_speed"],
-            uva=comfort_values["uva"],
-            aod=comfort_values["aod"],
-            simple_avg=simple_avg,
-            weighted_avg=weighted_avg,
+            temperature=values[0],
+            humidity=values[1],
+            wind_speed=values[2],
+            uva=values[3],
+            aod=values[4],
+            simple_avg=values[5],
+            weighted_avg=values[6],
             advice=advice
         )
+
+    @staticmethod
+    def get_comfort(weather_forecast: dict, age: float, height: float, weight: float, sex: Sex) -> ComfortDTO:
+        model = get_comfort_model()
+        x = np.concatenate([
+            ComfortModel.weather_features(weather_forecast),
+            ComfortModel.profile_features(age, height, weight, sex.value),
+        ])
+        values = model.evaluate(x).tolist()
+        return ComfortService._to_dto(values, ComfortService._advices_from_rules(weather_forecast))
+
+    @staticmethod
+    def comfort_matrix(weather_forecasts: Sequence[dict], profiles: Sequence[Tuple[float, float, float, Sex]]) -> np.ndarray:
+        weather = [ComfortModel.weather_features(w) for w in weather_forecasts]
+        people = [ComfortModel.profile_features(age, height, weight, sex.value) for age, height, weight, sex in profiles]
+        return get_comfort_model().evaluate_grid(weather, people)
+
+    @staticmethod
+    def comfort_series(weather: np.ndarray, age: float, height: float, weight: float, sex: Sex) -> np.ndarray:
+        # A missing reading stays NaN, so that hour's comfort comes out NaN rather than scored as a zero reading.
+        n_weather = len(WEATHER_FEATURES)
+        x = np.empty((len(weather), len(FEATURES)))
+        x[:, :n_weather] = weather[:, :n_weather]
+        x[:, n_weather:] = ComfortModel.profile_features(age, height, weight, sex.value)
+        return get_comfort_model().evaluate(x)
+
+    @staticmethod
+    def get_comfort_batch(
+        weather_forecasts: Sequence[dict],
+        profiles: Sequence[Tuple[float, float, float, Sex]],
+    ) -> List[List[ComfortDTO]]:
+        matrix = ComfortService.comfort_matrix(weather_forecasts, profiles)
+        advices = get_advice_rules().advise_many(weather_forecasts)
+        return [
+            [ComfortService._to_dto(vals, advice) for vals in matrix_row]
+            for matrix_row, advice in zip(matrix.tolist(), advices)
+        ]
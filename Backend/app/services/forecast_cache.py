@@ -0,0 +1,155 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+Encoded = Tuple[bytes, str]
+PendingRows = Dict[str, Dict[str, Dict[str, Any]]]
+
+
+class ForecastCache:
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._encoded: Dict[str, Tuple[str, Encoded]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.encoded_hits = 0
+
+    def get(self, city_key: str, date: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return self._get_locked((city_key, date), now)
+
+    def get_many(self, city_key: str, dates: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for d in dates:
+                row = self._get_locked((city_key, d), now)
+                if row is not None:
+                    found[d] = row
+        return found
+
+    def _get_locked(self, key: CacheKey, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, row = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return row
+
+    def put(self, city_key: str, date: str, row: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        self.put_many(city_key, {date: row}, ttl_seconds)
+
+    def put_many(self, city_key: str, rows: Dict[str, Dict[str, Any]], ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            for d, row in rows.items():
+                key = (city_key, d)
+                self._entries[key] = (expires_at, row)
+                self._entries.move_to_end(key)
+            if rows:
+                self._encoded.pop(city_key, None)
+            while len(self._entries) > self.max_entries:
+                (evicted_city, _), _ = self._entries.popitem(last=False)
+                self._encoded.pop(evicted_city, None)
+                self.evictions += 1
+
+    def get_encoded(self, city_key: str, first_date: str) -> Optional[Encoded]:
+        with self._lock:
+            entry = self._encoded.get(city_key)
+            if entry is None or entry[0] != first_date:
+                return None
+            self.encoded_hits += 1
+            return entry[1]
+
+    def put_encoded(self, city_key: str, rows: Dict[str, Dict[str, Any]], body: bytes, etag: str) -> None:
+        # Only keep the body if it was built from the rows currently cached.
+        with self._lock:
+            for d, row in rows.items():
+                entry = self._entries.get((city_key, d))
+                if entry is None or entry[1] is not row:
+                    return
+            self._encoded[city_key] = (min(rows), (body, etag))
+
+    def invalidate(self, city_key: Optional[str] = None) -> None:
+        with self._lock:
+            if city_key is None:
+                self._entries.clear()
+                self._encoded.clear()
+                return
+            for key in [k for k in self._entries if k[0] == city_key]:
+                del self._entries[key]
+            self._encoded.pop(city_key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "encoded": len(self._encoded),
+                "encoded_hits": self.encoded_hits,
+            }
+
+
+class WriteBehindWriter:
+    def __init__(self, persist: Callable[[PendingRows], None], flush_interval: float = 1.0):
+        self._persist = persist
+        self.flush_interval = flush_interval
+        self._pending: PendingRows = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def submit(self, city_key: str, rows: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            self._pending.setdefault(city_key, {}).update(rows)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="forecast-write-behind", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self._persist(pending)
+                logger.debug("Write-behind flushed %d cities", len(pending))
+            except Exception as e:
+                logger.warning("Write-behind flush failed, will retry: %s", e)
+                with self._lock:
+                    for city_key, rows in pending.items():
+                        merged = dict(rows)
+                        merged.update(self._pending.get(city_key, {}))
+                        self._pending[city_key] = merged
+                self._wakeup.set()
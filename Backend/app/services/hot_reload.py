@@ -0,0 +1,59 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class HotReloadingFile(Generic[T]):
+    def __init__(self, path: Path, loader: Callable[[Path], T], check_interval: float = 2.0):
+        self.path = Path(path)
+        self.loader = loader
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._value: T = self._load_initial()
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_initial(self) -> T:
+        self._stamp = self._file_stamp()
+        self._checked_at = time.monotonic()
+        return self.loader(self.path)
+
+    def get(self) -> T:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._maybe_reload(now)
+        return self._value
+
+    def _maybe_reload(self, now: float) -> None:
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            stamp = self._file_stamp()
+            if stamp is None or stamp == self._stamp:
+                return
+            try:
+                value = self.loader(self.path)
+            except Exception as e:
+                logger.error("Failed to reload %s, keeping previous version: %s", self.path, e)
+                self._stamp = stamp
+                return
+            self._value = value
+            self._stamp = stamp
+            logger.info("Reloaded %s", self.path)
+        finally:
+            self._lock.release()
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+HOURLY_COLUMNS = ("temperature", "humidity", "windspeed", "uv_index", "aod")
+AOD_COLUMN = HOURLY_COLUMNS.index("aod")
+
+
+class HourlySeries:
+    __slots__ = ("times", "values", "timezone", "partial")
+
+    def __init__(self, times: np.ndarray, values: np.ndarray, timezone: Optional[str] = None, partial: bool = False):
+        self.times = times
+        self.values = values
+        self.timezone = timezone
+        self.partial = partial
+
+    @classmethod
+    def from_columns(cls, data: Dict[str, Any]) -> "HourlySeries":
+        times = np.array(data.get("time") or [], dtype="datetime64[m]")
+        # One float32 row per hour; missing readings stay NaN so callers can tell them apart from zeros.
+        values = np.empty((len(times), len(HOURLY_COLUMNS)), dtype=np.float32)
+        for j, column in enumerate(HOURLY_COLUMNS):
+            values[:, j] = np.array(data.get(column) or [None] * len(times), dtype=float)
+        partial = bool(len(times)) and bool(np.isnan(values[:, AOD_COLUMN]).all())
+        return cls(times, values, data.get("timezone"), partial)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes
+
+    def time_strings(self) -> List[str]:
+        return np.datetime_as_string(self.times, unit="m").tolist()
+
+
+class HourlyCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, HourlySeries]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, city_key: str) -> Optional[HourlySeries]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(city_key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[city_key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(city_key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, city_key: str, series: HourlySeries, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._entries[city_key] = (expires_at, series)
+            self._entries.move_to_end(city_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(series.nbytes for _, series in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import logging
+import math
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+if TYPE_CHECKING:
+    from app.services.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") not in ("0", "false", "no")
+PREFETCH_TOP_CITIES = int(os.getenv("PREFETCH_TOP_CITIES", "50"))
+PREFETCH_INTERVAL_SECONDS = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "60"))
+PREFETCH_LEAD_SECONDS = float(os.getenv("PREFETCH_LEAD_SECONDS", "1800"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+
+
+class CityPopularity:
+    def __init__(self, half_life_seconds: float = 3600, max_cities: int = 5000):
+        self.decay = math.log(2) / half_life_seconds
+        self.max_cities = max_cities
+        self._scores: Dict[str, Tuple[float, float, str]] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, at: float, now: float) -> float:
+        return score * math.exp(-self.decay * (now - at))
+
+    def record(self, city: str) -> None:
+        key = city.lower()
+        now = time.monotonic()
+        with self._lock:
+            score, at, _ = self._scores.get(key, (0.0, now, city))
+            self._scores[key] = (self._decayed(score, at, now) + 1.0, now, city)
+            if len(self._scores) > self.max_cities:
+                coldest = min(self._scores, key=lambda k: self._decayed(self._scores[k][0], self._scores[k][1], now))
+                del self._scores[coldest]
+
+    def top(self, n: int) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            ranked = sorted(
+                self._scores.values(),
+                key=lambda item: self._decayed(item[0], item[1], now),
+                reverse=True,
+            )
+        return [city for _, _, city in ranked[:n]]
+
+
+class PrefetchScheduler:
+    def __init__(
+        self,
+        service_factory: Callable[[], "WeatherService"],
+        popularity: CityPopularity,
+        fresh_seconds: float,
+        top_n: int = PREFETCH_TOP_CITIES,
+        interval_seconds: float = PREFETCH_INTERVAL_SECONDS,
+        lead_seconds: float = PREFETCH_LEAD_SECONDS,
+        concurrency: int = PREFETCH_CONCURRENCY,
+    ):
+        self.service_factory = service_factory
+        self.popularity = popularity
+        self.fresh_seconds = fresh_seconds
+        self.top_n = top_n
+        self.interval_seconds = interval_seconds
+        self.lead_seconds = lead_seconds
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.refreshed = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="forecast-prefetch")
+            logger.info("Prefetch scheduler started: top=%d interval=%ss lead=%ss",
+                        self.top_n, self.interval_seconds, self.lead_seconds)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.warning("Prefetch run failed: %s", e)
+
+    @staticmethod
+    def _seconds_to_midnight(tz: Optional[datetime.tzinfo]) -> float:
+        now = datetime.datetime.now(tz)
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), tzinfo=now.tzinfo)
+        return (midnight - now).total_seconds()
+
+    async def _city_timezone(self, service: "WeatherService", city: str) -> Optional[datetime.tzinfo]:
+        _, loc = await service.openmeteo_client.geocode_cache.aget(city)
+        if not loc or not loc.get("timezone"):
+            return None
+        try:
+            return ZoneInfo(loc["timezone"])
+        except Exception:
+            return None
+
+    async def due_reason(self, service: "WeatherService", city: str) -> Optional[str]:
+        window = service.prefetch_window()
+        target, lookahead = window[:-1], window[-1]
+        rows = await service.acached_rows(city, window)
+        if any(d not in rows for d in target):
+            return "missing"
+        if any(rows[d].get("partial") for d in target):
+            return "partial"
+        if time.time() - service.oldest_update(rows, target) > self.fresh_seconds - self.interval_seconds:
+            return "stale"
+        if lookahead not in rows:
+            to_midnight = min(
+                self._seconds_to_midnight(await self._city_timezone(service, city)),
+                self._seconds_to_midnight(None),
+            )
+            if to_midnight <= self.lead_seconds:
+                return "rollover"
+        return None
+
+    async def tick(self) -> int:
+        self.runs += 1
+        service = self.service_factory()
+        due: List[Tuple[str, str]] = []
+        for city in self.popularity.top(self.top_n):
+            reason = await self.due_reason(service, city)
+            if reason:
+                due.append((city, reason))
+        if not due:
+            return 0
+
+        logger.info("Prefetching %d hot cities: %s", len(due), ", ".join(f"{c} ({r})" for c, r in due))
+        await service.arevalidate_many([city for city, _ in due], concurrency=self.concurrency)
+        self.refreshed += len(due)
+        return len(due)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "refreshed": self.refreshed,
+        }
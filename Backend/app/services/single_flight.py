@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class SingleFlight:
+    # priority, when given, reads the caller's rank (lower is more urgent). A caller never waits on a flight led
+    # at a lower rank, since that flight is held to the leader's quota and wait budget; it leads its own instead,
+    # and later callers join that one.
+    def __init__(self, priority: Optional[Callable[[], int]] = None):
+        self._priority = priority
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Tuple[Future, int]] = {}
+        self._tasks: Set["asyncio.Task"] = set()
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.superseded = 0
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        rank = int(self._priority()) if self._priority is not None else 0
+        with self._lock:
+            self.calls += 1
+            entry = self._inflight.get(key)
+            if entry is not None and entry[1] <= rank:
+                self.coalesced += 1
+                return entry[0], False
+            if entry is not None:
+                self.superseded += 1
+            fut = Future()
+            self._inflight[key] = (fut, rank)
+            self.leaders += 1
+            return fut, True
+
+    def _finish(self, key: Hashable, fut: Future, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is fut:
+                del self._inflight[key]
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._inflight
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, fut, error=e)
+            raise
+        self._finish(key, fut, result)
+        return result
+
+    def _settle(self, key: Hashable, fut: Future, t: "asyncio.Future") -> None:
+        if t.cancelled():
+            self._finish(key, fut, error=asyncio.CancelledError())
+        elif t.exception() is not None:
+            self._finish(key, fut, error=t.exception())
+        else:
+            self._finish(key, fut, t.result())
+
+    def _lead(self, key: Hashable, fut: Future, awaitable: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(awaitable)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda t: self._settle(key, fut, t))
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut, leader = self._join(key)
+        if leader:
+            self._lead(key, fut, fn())
+        return await asyncio.shield(asyncio.wrap_future(fut))
+
+    def start_many(
+        self,
+        keys: Iterable[Hashable],
+        fn: Callable[[List[Hashable]], Dict[Hashable, Awaitable[Any]]],
+    ) -> Dict[Hashable, "asyncio.Future"]:
+        # fn starts the work for the keys nobody else is running and returns one awaitable per key, so each key
+        # settles on its own instead of waiting for the whole group.
+        joined = [(key,) + self._join(key) for key in dict.fromkeys(keys)]
+        leaders = [key for key, _, leader in joined if leader]
+        if leaders:
+            try:
+                started = fn(leaders)
+            except BaseException as e:
+                for key, fut, leader in joined:
+                    if leader:
+                        self._finish(key, fut, error=e)
+                raise
+            for key, fut, leader in joined:
+                if not leader:
+                    continue
+                if key in started:
+                    self._lead(key, fut, started[key])
+                else:
+                    self._finish(key, fut, error=KeyError(key))
+        return {key: asyncio.shield(asyncio.wrap_future(fut)) for key, fut, _ in joined}
+
+    async def ado_many(
+        self,
+        keys: Iterable[Hashable],
+        fn: Callable[[List[Hashable]], Dict[Hashable, Awaitable[Any]]],
+    ) -> Dict[Hashable, Any]:
+        results: Dict[Hashable, Any] = {}
+        for key, waiter in self.start_many(keys, fn).items():
+            try:
+                results[key] = await waiter
+            except Exception as e:
+                results[key] = e
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "superseded": self.superseded,
+                "in_flight": len(self._inflight),
+            }
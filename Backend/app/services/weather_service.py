@@ -1,48 +1,231 @@
 import os
-import json
+import asyncio
 import datetime
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Optional, Sequence, Set, Tuple
+
+import numpy as np
 
-from app.models.weather_dto import WeatherDTO, ComfortDTO
+from app.clients.circuit_breaker import breaker_stats
+from app.clients.rate_limiter import Priority, RateLimitedError, current_priority, limiter_stats, upstream_priority
+from app.deadline import Deadline, DeadlineExceeded
+from app.metrics import CACHE_REQUESTS, STAGE_SECONDS
+from app.models.weather_dto import WeatherDTO, ComfortDTO, ComfortBatchItemDTO, HistoryDTO, HourlyComfortDTO
 from app.clients.openmeteo_client import OpenMeteoClient
 from app.clients.openweather_client import OpenWeatherClient
-from app.services.comfort_service import Sex, ComfortService
+from app.services.comfort_memo import ComfortMemo
+from app.services.comfort_model import OUTPUTS as COMFORT_OUTPUTS
+from app.services.comfort_service import Sex, ComfortService, comfort_version
+from app.services.hourly_cache import HourlyCache, HourlySeries
+from app.services.forecast_cache import ForecastCache, WriteBehindWriter, PendingRows
+from app.services.prefetch import CityPopularity
+from app.services.single_flight import SingleFlight
+from app.storage.forecast_archive import ForecastArchive
+from app.storage.forecast_store import ForecastStore
+from app.storage.sqlite_store import SqliteForecastStore
 
 logger = logging.getLogger(__name__)
 
+FORECAST_DB = os.getenv("WEATHER_DB_PATH", "weather_forecast.sqlite3")
+LEGACY_FORECAST_FILE = os.getenv("WEATHER_CACHE_FILE", "weather_forecast.json")
+FORECAST_ARCHIVE_DIR = os.getenv("WEATHER_ARCHIVE_DIR", "weather_archive")
+
+FORECAST_CACHE = ForecastCache(
+    max_entries=int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "4096")),
+    ttl_seconds=float(os.getenv("FORECAST_CACHE_TTL_SECONDS", str(6 * 3600))),
+)
+
+FORECAST_DAYS = 6
+PREFETCH_DAYS = FORECAST_DAYS + 1
+FORECAST_FRESH_SECONDS = float(os.getenv("FORECAST_FRESH_SECONDS", str(3 * 3600)))
+PARTIAL_ROW_TTL_SECONDS = float(os.getenv("PARTIAL_ROW_TTL_SECONDS", "300"))
+REVALIDATE_RETRY_SECONDS = float(os.getenv("REVALIDATE_RETRY_SECONDS", "60"))
+ARCHIVE_WEATHER_FIELDS = ("temperature", "humidity", "windspeed", "uv_index", "aod")
+DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "0.25"))
+
+COMFORT_MEMO = ComfortMemo(
+    max_entries=int(os.getenv("COMFORT_MEMO_MAX_ENTRIES", "20000")),
+    age_step=float(os.getenv("COMFORT_MEMO_AGE_STEP", "1")),
+    height_step=float(os.getenv("COMFORT_MEMO_HEIGHT_STEP", "1")),
+    weight_step=float(os.getenv("COMFORT_MEMO_WEIGHT_STEP", "0.5")),
+)
+
+HOURLY_CACHE = HourlyCache(
+    max_entries=int(os.getenv("HOURLY_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("HOURLY_CACHE_TTL_SECONDS", "3600")),
+)
+
+REFRESH_FLIGHTS = SingleFlight(priority=current_priority)
+CITY_POPULARITY = CityPopularity(
+    half_life_seconds=float(os.getenv("POPULARITY_HALF_LIFE_SECONDS", "3600")),
+)
+
+_background_tasks: Set["asyncio.Task"] = set()
+_revalidate_lock = threading.Lock()
+_revalidated_at: Dict[str, float] = {}
+
+_store_lock = threading.Lock()
+_default_store: Optional[ForecastStore] = None
+_default_archive: Optional[ForecastArchive] = None
+_writers: Dict[ForecastStore, WriteBehindWriter] = {}
+_archives: Dict[ForecastStore, ForecastArchive] = {}
+_evicted_through: Dict[ForecastStore, str] = {}
+
+
+def get_default_store() -> ForecastStore:
+    global _default_store
+    with _store_lock:
+        if _default_store is None:
+            store = SqliteForecastStore(FORECAST_DB)
+            if store.is_empty() and os.path.exists(LEGACY_FORECAST_FILE):
+                logger.info("Importing legacy forecast cache %s into %s", LEGACY_FORECAST_FILE, FORECAST_DB)
+                store.import_json(LEGACY_FORECAST_FILE)
+            _default_store = store
+        return _default_store
+
+
+def get_default_archive() -> ForecastArchive:
+    global _default_archive
+    if _default_archive is None:
+        _default_archive = ForecastArchive(FORECAST_ARCHIVE_DIR)
+    return _default_archive
+
+
+def _get_writer(store: ForecastStore) -> WriteBehindWriter:
+    with _store_lock:
+        writer = _writers.get(store)
+        if writer is None:
+            writer = WriteBehindWriter(lambda pending: _persist_rows(store, pending))
+            _writers[store] = writer
+        return writer
+
+
+def _persist_rows(store: ForecastStore, pending: PendingRows) -> None:
+    store.upsert_rows(pending)
+    _evict_past(store)
+
+
+def _evict_past(store: ForecastStore) -> None:
+    today = datetime.date.today().isoformat()
+    if _evicted_through.get(store) == today:
+        return
+    archive = _archives.get(store) or get_default_archive()
+    store.drain_before(today, archive.append)
+    _evicted_through[store] = today
+
+
+def _claim_revalidation(city_key: str) -> bool:
+    # Rows that come back partial (or a refresh that fails) stay stale; retry them on a timer, not on every hit.
+    if REFRESH_FLIGHTS.in_flight(city_key):
+        return False
+    now = time.monotonic()
+    with _revalidate_lock:
+        if now - _revalidated_at.get(city_key, -REVALIDATE_RETRY_SECONDS) < REVALIDATE_RETRY_SECONDS:
+            return False
+        if len(_revalidated_at) >= 10000:
+            for key in [k for k, at in _revalidated_at.items() if now - at >= REVALIDATE_RETRY_SECONDS]:
+                del _revalidated_at[key]
+        _revalidated_at[city_key] = now
+    return True
+
+
+def _is_placeholder(row: Dict[str, Any]) -> bool:
+    # A date no provider returned anything for: served as such, never persisted, archived or scored.
+    return set(row) <= {"date", "partial", "updated_at"}
+
+
+async def _within(awaitable: Awaitable[Any], deadline: Optional[Deadline]) -> Any:
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"request deadline of {deadline.seconds:g}s exceeded")
+
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
 
 class WeatherService:
-    def __init__(self, openmeteo_client: OpenMeteoClient, openweather_client: OpenWeatherClient):
+    def __init__(self, openmeteo_client: OpenMeteoClient, openweather_client: OpenWeatherClient,
+                 cache: ForecastCache = FORECAST_CACHE, store: Optional[ForecastStore] = None,
+                 archive: Optional[ForecastArchive] = None):
         self.openmeteo_client = openmeteo_client
         self.openweather_client = openweather_client
-        self.file_path = "weather_forecast.json"
+        self.cache = cache
+        self.store = store or get_default_store()
+        self.archive = archive or get_default_archive()
+        # Past rows drain into the archive this service reads history from.
+        _archives[self.store] = self.archive
+        _evict_past(self.store)
 
-    def _ensure_cache(self) -> Dict[str, Any]:
-        if not os.path.exists(self.file_path):
-            logger.info("Cache file not found, initializing new cache at %s", self.file_path)
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                json.dump({}, f, ensure_ascii=False, indent=4)
-        try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if not isinstance(data, dict):
-                    logger.warning("Cache file structure invalid, resetting cache")
-                    return {}
-                return data
-        except json.JSONDecodeError:
-            logger.warning("Cache file is corrupted JSON, resetting cache")
-            return {}
-
-    def _save_cache(self, data: Dict[str, Any]) -> None:
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        logger.debug("Cache persisted to %s", self.file_path)
+    def _save_rows(self, city_key: str, rows: Dict[str, Dict[str, Any]]) -> None:
+        with STAGE_SECONDS.time(stage="cache_write"):
+            now = time.time()
+            for row in rows.values():
+                row["updated_at"] = now
+            complete = {d: row for d, row in rows.items() if not row.get("partial")}
+            partial = {d: row for d, row in rows.items() if row.get("partial")}
+            self.cache.put_many(city_key, complete)
+            # Partial rows stay in memory only, briefly, so the next request upgrades them.
+            self.cache.put_many(city_key, partial, ttl_seconds=PARTIAL_ROW_TTL_SECONDS)
+            COMFORT_MEMO.invalidate(city_key, rows)
+            if complete:
+                _get_writer(self.store).submit(city_key, complete)
+
+    def _load_city(self, city_key: str, dates: List[str]) -> Dict[str, Dict[str, Any]]:
+        with STAGE_SECONDS.time(stage="cache_read"):
+            found = self.cache.get_many(city_key, dates)
+            if len(found) < len(dates):
+                self._fill_from_store(city_key, dates, found)
+            return found
+
+    async def _aload_city(self, city_key: str, dates: List[str]) -> Dict[str, Dict[str, Any]]:
+        with STAGE_SECONDS.time(stage="cache_read"):
+            found = self.cache.get_many(city_key, dates)
+            if len(found) < len(dates):
+                await asyncio.to_thread(self._fill_from_store, city_key, dates, found)
+            return found
+
+    async def _aload_many(self, city_keys: List[str], dates: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        with STAGE_SECONDS.time(stage="cache_read"):
+            blocks = {city_key: self.cache.get_many(city_key, dates) for city_key in city_keys}
+            incomplete = [city_key for city_key, found in blocks.items() if len(found) < len(dates)]
+            if incomplete:
+                loaded = await asyncio.to_thread(self.store.get_many, incomplete, dates)
+                for city_key, rows in loaded.items():
+                    rows = {d: row for d, row in rows.items() if d not in blocks[city_key]}
+                    self.cache.put_many(city_key, rows)
+                    blocks[city_key].update(rows)
+            return blocks
+
+    def _fill_from_store(self, city_key: str, dates: List[str], found: Dict[str, Dict[str, Any]]) -> None:
+        loaded = self.store.get_rows(city_key, [d for d in dates if d not in found])
+        if loaded:
+            self.cache.put_many(city_key, loaded)
+            found.update(loaded)
 
     @staticmethod
-    def _six_dates_from_today() -> List[str]:
+    def _dates_from_today(days: int) -> List[str]:
         today = datetime.date.today()
-        return [(today + datetime.timedelta(days=i)).isoformat() for i in range(6)]
+        return [(today + datetime.timedelta(days=i)).isoformat() for i in range(days)]
+
+    @staticmethod
+    def _six_dates_from_today() -> List[str]:
+        return WeatherService._dates_from_today(FORECAST_DAYS)
+
+    @staticmethod
+    def prefetch_window() -> List[str]:
+        return WeatherService._dates_from_today(PREFETCH_DAYS)
 
     @staticmethod
     def _sanitize_row(row: Dict[str, Any]) -> Dict[str, Any]:
@@ -55,59 +238,440 @@ class WeatherService:
             "uv_index": int(row.get("uv_index") or 0),
             "cloudcover": float(row.get("cloudcover") or 0.0),
             "aod": float(row.get("aod") or 0.0),
+            "partial": bool(row.get("partial")),
         }
 
+    @staticmethod
+    def _served_dates(city_block: Dict[str, Dict[str, Any]], target_dates: List[str]) -> List[str]:
+        # Dates nothing arrived for are left out rather than served as zeros.
+        return [d for d in target_dates if d in city_block and not _is_placeholder(city_block[d])]
+
+    def _to_dtos(self, city_block: Dict[str, Dict[str, Any]], target_dates: List[str]) -> List[WeatherDTO]:
+        return [WeatherDTO(**self._sanitize_row(city_block[d])) for d in self._served_dates(city_block, target_dates)]
+
+    @staticmethod
+    def oldest_update(city_block: Dict[str, Dict[str, Any]], dates: List[str]) -> float:
+        return min((float(city_block[d].get("updated_at") or 0.0) if d in city_block else 0.0) for d in dates)
+
+    def _is_stale(self, city_block: Dict[str, Dict[str, Any]], target_dates: List[str]) -> bool:
+        if any(city_block[d].get("partial") for d in target_dates if d in city_block):
+            return True
+        return time.time() - self.oldest_update(city_block, target_dates) > FORECAST_FRESH_SECONDS
+
+    @staticmethod
+    def _fetch_range(target_dates: List[str], missing: List[str], refresh_existing: bool) -> Tuple[str, str]:
+        dates = target_dates if refresh_existing or not missing else missing
+        return min(dates), max(dates)
+
     def get_weather(self, city: str) -> List[WeatherDTO]:
         city_key = city.lower()
+        CITY_POPULARITY.record(city)
         target_dates = self._six_dates_from_today()
-        weather_data = self._ensure_cache()
-        city_block: Dict[str, Any] = weather_data.get(city_key, {})
+        city_block = self._load_city(city_key, target_dates)
         missing = [d for d in target_dates if d not in city_block]
         if not missing:
+            stale = self._is_stale(city_block, target_dates)
+            CACHE_REQUESTS.inc(endpoint="forecast", result="stale" if stale else "hit")
+            if stale:
+                self._revalidate_in_background(city)
             logger.info("Cache hit: city=%s, returning 6 days from cache", city)
-            return [WeatherDTO(**self._sanitize_row(city_block[d])) for d in target_dates]
+            return self._to_dtos(city_block, target_dates)
 
+        CACHE_REQUESTS.inc(endpoint="forecast", result="miss")
         logger.info("Cache miss: city=%s, missing_days=%s; fetching external forecasts", city, ",".join(missing))
-        om_days = self.openmeteo_client.get_weather(city, days=6) or []
-        logger.info("Open-Meteo returned %d daily rows for city=%s", len(om_days), city)
+        city_block.update(REFRESH_FLIGHTS.do(city_key, lambda: self._refresh(city, target_dates, missing)))
+        return self._to_dtos(city_block, target_dates)
+
+    def _refresh(
+        self,
+        city: str,
+        target_dates: List[str],
+        missing: List[str],
+        refresh_existing: bool = False,
+    ) -> Dict[str, Dict[str, Any]]:
+        start, end = self._fetch_range(target_dates, missing, refresh_existing)
+        om_days = self.openmeteo_client.get_weather(city, start_date=start, end_date=end) or []
+        logger.info("Open-Meteo returned %d daily rows for city=%s range=%s..%s", len(om_days), city, start, end)
         try:
-            ow_days = self.openweather_client.get_weather(city, days=6) or []
+            ow_days = self.openweather_client.get_weather(city, start_date=start, end_date=end) or []
             logger.info("OpenWeather returned %d daily rows for city=%s", len(ow_days), city)
         except Exception as e:
             logger.warning("OpenWeather failed for city=%s: %s", city, e)
             ow_days = []
 
-        by_date: Dict[str, Dict[str, Any]] = {}
-        for row in om_days:
-            d = str(row.get("date") or "")
-            if d:
-                by_date[d] = dict(row)
-        for row in ow_days:
-            d = str(row.get("date") or "")
-            if not d:
-                continue
-            base = by_date.setdefault(d, {"date": d})
-            for k, v in row.items():
-                if k == "date":
-                    continue
-                if base.get(k) in (None, ""):
-                    base[k] = v
-        for d in target_dates:
-            by_date.setdefault(d, {"date": d})
-
-        weather_data.setdefault(city_key, {})
-        created, skipped = 0, 0
-        for d in target_dates:
-            merged_row = self._sanitize_row(by_date.get(d, {"date": d}))
-            if d not in weather_data[city_key] or not weather_data[city_key][d]:
-                weather_data[city_key][d] = merged_row
-                created += 1
+        current = self._load_city(city.lower(), target_dates) if refresh_existing else None
+        return self._merge_and_save(city, target_dates, missing, om_days, ow_days, refresh_existing, current)
+
+    def _revalidate_in_background(self, city: str) -> None:
+        if not _claim_revalidation(city.lower()):
+            return
+        logger.info("Serving stale forecast for city=%s while it refreshes", city)
+        threading.Thread(target=self._revalidate, args=(city,), name="forecast-revalidate", daemon=True).start()
+
+    def _revalidate(self, city: str) -> None:
+        window = self.prefetch_window()
+        try:
+            with upstream_priority(Priority.PREFETCH):
+                REFRESH_FLIGHTS.do(city.lower(), lambda: self._refresh(city, window, [], refresh_existing=True))
+        except Exception as e:
+            logger.warning("Background refresh failed for city=%s: %s", city, e)
+
+    async def aget_weather(self, city: str, deadline: Optional[Deadline] = None) -> List[WeatherDTO]:
+        city_block, target_dates = await self._aget_block(city, deadline)
+        return self._to_dtos(city_block, target_dates)
+
+    async def aget_weather_encoded(self, city: str, deadline: Optional[Deadline] = None) -> Tuple[bytes, str]:
+        city_block, target_dates = await self._aget_block(city, deadline)
+        city_key = city.lower()
+        cached = self.cache.get_encoded(city_key, target_dates[0])
+        if cached is not None:
+            return cached
+        payload = [self._sanitize_row(city_block[d]) for d in self._served_dates(city_block, target_dates)]
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = content_etag(body)
+        if all(d in city_block for d in target_dates):
+            self.cache.put_encoded(city_key, {d: city_block[d] for d in target_dates}, body, etag)
+        return body, etag
+
+    async def _aget_block(
+        self,
+        city: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        city_key = city.lower()
+        CITY_POPULARITY.record(city)
+        target_dates = self._six_dates_from_today()
+        city_block = await self._aload_city(city_key, target_dates)
+        missing = [d for d in target_dates if d not in city_block]
+        if not missing:
+            stale = self._is_stale(city_block, target_dates)
+            CACHE_REQUESTS.inc(endpoint="forecast", result="stale" if stale else "hit")
+            if stale and _claim_revalidation(city_key):
+                logger.info("Serving stale forecast for city=%s while it refreshes", city)
+                task = asyncio.ensure_future(self.arevalidate(city))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+            logger.info("Cache hit: city=%s, returning 6 days from cache", city)
+            return city_block, target_dates
+
+        CACHE_REQUESTS.inc(endpoint="forecast", result="miss")
+        logger.info("Cache miss: city=%s, missing_days=%s; fetching external forecasts", city, ",".join(missing))
+        # Upstream calls stop a little early so whatever arrived can still be merged and returned in time.
+        fetch_deadline = deadline.shortened(DEADLINE_RESERVE_SECONDS) if deadline is not None else None
+        refresh = REFRESH_FLIGHTS.ado(
+            city_key, lambda: self._arefresh(city, target_dates, missing, deadline=fetch_deadline)
+        )
+        try:
+            city_block.update(await _within(refresh, deadline))
+        except DeadlineExceeded:
+            if not city_block:
+                raise DeadlineExceeded(f"no forecast for {city} within the request deadline")
+            logger.warning("Deadline exceeded for city=%s; serving %d cached days, %d missing",
+                           city, len(city_block), len(missing))
+            city_block.update({d: {"date": d, "partial": True} for d in missing})
+        return city_block, target_dates
+
+    async def arevalidate(self, city: str) -> None:
+        window = self.prefetch_window()
+        try:
+            with upstream_priority(Priority.PREFETCH):
+                await REFRESH_FLIGHTS.ado(city.lower(), lambda: self._arefresh(city, window, [], refresh_existing=True))
+        except Exception as e:
+            logger.warning("Background refresh failed for city=%s: %s", city, e)
+
+    async def acached_rows(self, city: str, dates: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await self._aload_city(city.lower(), dates)
+
+    async def _arefresh(
+        self,
+        city: str,
+        target_dates: List[str],
+        missing: List[str],
+        refresh_existing: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        start, end = self._fetch_range(target_dates, missing, refresh_existing)
+        om_days, ow_days = await asyncio.gather(
+            self.openmeteo_client.aget_weather(city, start_date=start, end_date=end, deadline=deadline),
+            self._aopenweather_days(city, start, end, deadline),
+        )
+        om_days = om_days or []
+        logger.info("Open-Meteo returned %d daily rows for city=%s range=%s..%s", len(om_days), city, start, end)
+
+        current = await self._aload_city(city.lower(), target_dates) if refresh_existing else None
+        return self._merge_and_save(city, target_dates, missing, om_days, ow_days, refresh_existing, current)
+
+    async def astream_weather_many(
+        self,
+        cities: Sequence[str],
+        concurrency: int,
+    ) -> AsyncIterator[Tuple[str, Optional[List[WeatherDTO]], Optional[str]]]:
+        unique: Dict[str, str] = {}
+        for city in cities:
+            unique.setdefault(city.lower(), city)
+        target_dates = self._six_dates_from_today()
+        blocks = await self._aload_many(list(unique), target_dates)
+
+        misses: List[str] = []
+        for city_key, city in unique.items():
+            city_block = blocks[city_key]
+            if all(d in city_block for d in target_dates):
+                yield city, self._to_dtos(city_block, target_dates), None
+            else:
+                misses.append(city)
+        CACHE_REQUESTS.inc(len(unique) - len(misses), endpoint="forecast_batch", result="hit")
+        CACHE_REQUESTS.inc(len(misses), endpoint="forecast_batch", result="miss")
+        logger.info("Batch forecast: cities=%d hits=%d misses=%d concurrency=%d",
+                    len(unique), len(unique) - len(misses), len(misses), concurrency)
+        if not misses:
+            return
+
+        for city in misses:
+            CITY_POPULARITY.record(city)
+        missing = {city.lower(): [d for d in target_dates if d not in blocks[city.lower()]] for city in misses}
+        with upstream_priority(Priority.BATCH):
+            pending = self.start_refresh_many(misses, target_dates, missing, concurrency=concurrency)
+
+        async def settle(city: str) -> Tuple[str, Any]:
+            try:
+                return city, await pending[city.lower()]
+            except Exception as e:
+                return city, e
+
+        tasks = [asyncio.ensure_future(settle(city)) for city in misses]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                city, rows = await next_done
+                if isinstance(rows, BaseException):
+                    logger.warning("Batch forecast failed for city=%s: %s", city, rows)
+                    yield city, None, str(rows) or type(rows).__name__
+                else:
+                    blocks[city.lower()].update(rows)
+                    yield city, self._to_dtos(blocks[city.lower()], target_dates), None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def start_refresh_many(
+        self,
+        cities: Sequence[str],
+        target_dates: List[str],
+        missing: Dict[str, List[str]],
+        refresh_existing: bool = False,
+        concurrency: int = 8,
+    ) -> Dict[str, "asyncio.Future"]:
+        by_key = {city.lower(): city for city in cities}
+        return REFRESH_FLIGHTS.start_many(list(by_key), lambda leaders: self._start_refresh_batch(
+            {k: by_key[k] for k in leaders}, target_dates, missing, refresh_existing, concurrency
+        ))
+
+    async def arefresh_many(
+        self,
+        cities: Sequence[str],
+        target_dates: List[str],
+        missing: Dict[str, List[str]],
+        refresh_existing: bool = False,
+        concurrency: int = 8,
+    ) -> Dict[str, Any]:
+        by_key = {city.lower(): city for city in cities}
+        return await REFRESH_FLIGHTS.ado_many(list(by_key), lambda leaders: self._start_refresh_batch(
+            {k: by_key[k] for k in leaders}, target_dates, missing, refresh_existing, concurrency
+        ))
+
+    async def arevalidate_many(self, cities: Sequence[str], concurrency: int = 8) -> None:
+        window = self.prefetch_window()
+        with upstream_priority(Priority.PREFETCH):
+            results = await self.arefresh_many(
+                cities, window, {city.lower(): [] for city in cities}, refresh_existing=True, concurrency=concurrency
+            )
+        for city_key, rows in results.items():
+            if isinstance(rows, BaseException):
+                logger.warning("Background refresh failed for city=%s: %s", city_key, rows)
+
+    def _start_refresh_batch(
+        self,
+        cities: Dict[str, str],
+        target_dates: List[str],
+        missing: Dict[str, List[str]],
+        refresh_existing: bool,
+        concurrency: int,
+    ) -> Dict[str, Awaitable[Dict[str, Dict[str, Any]]]]:
+        spans = {k: self._fetch_range(target_dates, missing.get(k, []), refresh_existing) for k in cities}
+        # Open-Meteo rows arrive per chunk; each city then completes on its own chunk and OpenWeather call.
+        openmeteo = self._start_openmeteo_batch(cities, spans, concurrency)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def refresh(k: str) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                ow_days = await self._aopenweather_days(cities[k], *spans[k])
+            om_days = await openmeteo[k]
+            current = await self._aload_city(k, target_dates) if refresh_existing else None
+            return self._merge_and_save(
+                cities[k], target_dates, missing.get(k, []), om_days, ow_days, refresh_existing, current
+            )
+
+        return {k: refresh(k) for k in cities}
+
+    def _start_openmeteo_batch(
+        self,
+        cities: Dict[str, str],
+        spans: Dict[str, Tuple[str, str]],
+        concurrency: int,
+    ) -> Dict[str, "asyncio.Future"]:
+        loop = asyncio.get_running_loop()
+        results = {k: loop.create_future() for k in cities}
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        size = max(1, self.openmeteo_client.BATCH_SIZE)
+        groups: Dict[Tuple[str, str], List[Tuple[str, Dict[str, Any]]]] = {}
+        chunks: List["asyncio.Future"] = []
+        queued = [len(cities)]
+
+        def settle(k: str, result: Any) -> None:
+            fut = results[k]
+            if fut.done():
+                return
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
             else:
-                skipped += 1
-        self._save_cache(weather_data)
-        logger.info("Cache updated: city=%s, created=%d, kept=%d", city, created, skipped)
+                fut.set_result(result)
+
+        async def fetch(span: Tuple[str, str], members: List[Tuple[str, Dict[str, Any]]]) -> None:
+            start, end = span
+            try:
+                async with semaphore:
+                    rows = await self.openmeteo_client.aget_weather_many(
+                        [loc for _, loc in members], start_date=start, end_date=end
+                    )
+            except Exception as e:
+                logger.warning("Open-Meteo batch failed for %d cities: %s", len(members), e)
+                for k, _ in members:
+                    settle(k, e)
+                return
+            logger.info("Open-Meteo batch returned rows for %d cities range=%s..%s", len(members), start, end)
+            for (k, _), city_rows in zip(members, rows):
+                settle(k, city_rows)
+
+        def flush(span: Tuple[str, str]) -> None:
+            chunks.append(asyncio.ensure_future(fetch(span, groups.pop(span))))
+
+        async def resolve(k: str) -> None:
+            try:
+                async with semaphore:
+                    queued[0] -= 1
+                    loc = await self.openmeteo_client.aresolve(cities[k])
+            except Exception as e:
+                settle(k, e)
+                loc = None
+            else:
+                if not loc:
+                    settle(k, [])
+            if loc:
+                groups.setdefault(spans[k], []).append((k, loc))
+            # A chunk goes out once it is full, or once nothing is left queued to join it, so a slow geocode
+            # only holds up the cities that share its chunk.
+            for span in [span for span, members in groups.items() if len(members) >= size or not queued[0]]:
+                flush(span)
+
+        async def run() -> None:
+            await asyncio.gather(*(resolve(k) for k in cities))
+            for span in list(groups):
+                flush(span)
+            await asyncio.gather(*chunks)
+
+        def finish(task: "asyncio.Future") -> None:
+            _background_tasks.discard(task)
+            for fut in results.values():
+                if fut.done():
+                    continue
+                if task.cancelled():
+                    fut.cancel()
+                else:
+                    fut.set_exception(task.exception() or RuntimeError("Open-Meteo batch returned no rows"))
+
+        task = asyncio.ensure_future(run())
+        _background_tasks.add(task)
+        task.add_done_callback(finish)
+        return results
+
+    async def _aopenweather_days(
+        self,
+        city: str,
+        start: str,
+        end: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        try:
+            ow_days = await self.openweather_client.aget_weather(
+                city, start_date=start, end_date=end, deadline=deadline
+            ) or []
+            logger.info("OpenWeather returned %d daily rows for city=%s", len(ow_days), city)
+            return ow_days
+        except (DeadlineExceeded, RateLimitedError) as e:
+            logger.info("OpenWeather skipped for city=%s: %s", city, e)
+            return None
+        except Exception as e:
+            logger.warning("OpenWeather failed for city=%s: %s", city, e)
+            return []
+
+    def _merge_and_save(
+        self,
+        city: str,
+        target_dates: List[str],
+        missing: List[str],
+        om_days: List[Dict[str, Any]],
+        ow_days: Optional[List[Dict[str, Any]]],
+        refresh_existing: bool = False,
+        current: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        with STAGE_SECONDS.time(stage="merge"):
+            by_date: Dict[str, Dict[str, Any]] = {}
+            for row in om_days:
+                d = str(row.get("date") or "")
+                if d:
+                    by_date[d] = dict(row)
+            # No OpenWeather gap-filling or no AOD: still served, but flagged and kept only briefly.
+            for row in by_date.values():
+                if ow_days is None or row.get("aod") is None:
+                    row["partial"] = True
+            for row in ow_days or []:
+                d = str(row.get("date") or "")
+                if not d:
+                    continue
+                base = by_date.setdefault(d, {"date": d})
+                for k, v in row.items():
+                    if k == "date":
+                        continue
+                    if base.get(k) in (None, ""):
+                        base[k] = v
+
+            rows = {d: self._sanitize_row(by_date[d]) if d in by_date else {"date": d, "partial": True}
+                    for d in missing}
+            if refresh_existing:
+                current = current or {}
+                for d in target_dates:
+                    if d in by_date and d not in rows:
+                        row = self._sanitize_row(by_date[d])
+                        # A degraded refresh never replaces a complete row; it is retried later instead.
+                        if row.get("partial") and d in current and not current[d].get("partial"):
+                            continue
+                        rows[d] = row
+        self._save_rows(city.lower(), rows)
+        logger.info("Cache updated: city=%s, created=%d, refreshed=%d, kept=%d",
+                    city, len(missing), len(rows) - len(missing), len(target_dates) - len(rows))
+        return rows
 
-        return [WeatherDTO(**self._sanitize_row(weather_data[city_key][d])) for d in target_dates]
+    def diagnostics(self) -> Dict[str, Any]:
+        return {
+            "forecast_cache": self.cache.stats(),
+            "comfort_memo": COMFORT_MEMO.stats(),
+            "hourly_cache": HOURLY_CACHE.stats(),
+            "archive": self.archive.stats(),
+            "geocode_cache": self.openmeteo_client.geocode_cache.stats(),
+            "refresh_single_flight": REFRESH_FLIGHTS.stats(),
+            "circuit_breakers": breaker_stats(),
+            "rate_limits": limiter_stats(),
+            "hot_cities": CITY_POPULARITY.top(10),
+        }
 
     def get_comfort(
         self,
@@ -118,18 +682,189 @@ class WeatherService:
         city: str,
         date: datetime.date
     ) -> ComfortDTO:
+        date_key = date.isoformat()
         city_key = city.lower()
+        CITY_POPULARITY.record(city)
+        profile = COMFORT_MEMO.quantize(age, height, weight, sex.value)
+        version = comfort_version()
+        comfort = COMFORT_MEMO.get(city_key, date_key, profile, version)
+        CACHE_REQUESTS.inc(endpoint="comfort", result="miss" if comfort is None else "hit")
+        if comfort is not None:
+            return comfort
+
+        epoch = COMFORT_MEMO.epoch
+        city_block = self._load_city(city_key, [date_key])
+        if date_key not in city_block and date_key in self._six_dates_from_today():
+            logger.info("Comfort lookup missed cache: city=%s date=%s; fetching forecast", city, date_key)
+            self.get_weather(city)
+            epoch = COMFORT_MEMO.epoch
+            city_block = self._load_city(city_key, [date_key])
+        q_age, q_height, q_weight, _ = profile
+        comfort = self._comfort_from_block(city_block, q_age, q_weight, q_height, sex, city, date_key)
+        COMFORT_MEMO.put(city_key, date_key, profile, version, comfort, epoch)
+        return comfort
+
+    async def aget_comfort(
+        self,
+        age: float,
+        weight: float,
+        height: float,
+        sex: Sex,
+        city: str,
+        date: datetime.date,
+        deadline: Optional[Deadline] = None,
+    ) -> ComfortDTO:
         date_key = date.isoformat()
-        weather_data = self._ensure_cache()
-        city_block = weather_data.get(city_key)
-        if not isinstance(city_block, dict) or date_key not in city_block:
+        city_key = city.lower()
+        CITY_POPULARITY.record(city)
+        profile = COMFORT_MEMO.quantize(age, height, weight, sex.value)
+        version = comfort_version()
+        comfort = COMFORT_MEMO.get(city_key, date_key, profile, version)
+        CACHE_REQUESTS.inc(endpoint="comfort", result="miss" if comfort is None else "hit")
+        if comfort is not None:
+            return comfort
+
+        epoch = COMFORT_MEMO.epoch
+        city_block = await self._aload_city(city_key, [date_key])
+        if date_key not in city_block and date_key in self._six_dates_from_today():
+            logger.info("Comfort lookup missed cache: city=%s date=%s; fetching forecast", city, date_key)
+            city_block, _ = await self._aget_block(city, deadline)
+            epoch = COMFORT_MEMO.epoch
+            row = city_block.get(date_key)
+            if row is not None and _is_placeholder(row) and deadline is not None \
+                    and deadline.shortened(DEADLINE_RESERVE_SECONDS).expired():
+                # Only a placeholder made it back before the deadline; there is nothing to compute from.
+                raise DeadlineExceeded(f"no forecast for {city} on {date_key} within the request deadline")
+        q_age, q_height, q_weight, _ = profile
+        comfort = self._comfort_from_block(city_block, q_age, q_weight, q_height, sex, city, date_key)
+        if not city_block[date_key].get("partial"):
+            COMFORT_MEMO.put(city_key, date_key, profile, version, comfort, epoch)
+        return comfort
+
+    async def aget_hourly_comfort(
+        self,
+        age: float,
+        weight: float,
+        height: float,
+        sex: Sex,
+        city: str,
+        deadline: Optional[Deadline] = None,
+    ) -> HourlyComfortDTO:
+        city_key = city.lower()
+        series = HOURLY_CACHE.get(city_key)
+        CACHE_REQUESTS.inc(endpoint="comfort_hourly", result="miss" if series is None else "hit")
+        if series is None:
+            logger.info("Hourly forecast miss: city=%s; fetching from Open-Meteo", city)
+            fetch_deadline = deadline.shortened(DEADLINE_RESERVE_SECONDS) if deadline is not None else None
+            series = await _within(
+                REFRESH_FLIGHTS.ado(("hourly", city_key), lambda: self._arefresh_hourly(city, fetch_deadline)),
+                deadline,
+            )
+        with STAGE_SECONDS.time(stage="comfort_hourly"):
+            values = ComfortService.comfort_series(series.values, age, height, weight, sex)
+        columns = {name: _nullable(column) for name, column in zip(COMFORT_OUTPUTS, values.T)}
+        return HourlyComfortDTO(
+            city=city, timezone=series.timezone, partial=series.partial, time=series.time_strings(), **columns
+        )
+
+    async def _arefresh_hourly(self, city: str, deadline: Optional[Deadline] = None) -> HourlySeries:
+        data = await self.openmeteo_client.aget_hourly(city, FORECAST_DAYS, deadline)
+        series = HourlySeries.from_columns(data or {})
+        ttl = PARTIAL_ROW_TTL_SECONDS if series.partial else None
+        HOURLY_CACHE.put(city.lower(), series, ttl_seconds=ttl)
+        logger.info("Cached %d hourly rows for city=%s (%d bytes, partial=%s)",
+                    len(series.times), city, series.nbytes, series.partial)
+        return series
+
+    async def ahistory(
+        self,
+        city: str,
+        start: datetime.date,
+        end: datetime.date,
+        profile: Optional[Tuple[float, float, float, Sex]] = None,
+        include_rows: bool = True,
+    ) -> HistoryDTO:
+        with STAGE_SECONDS.time(stage="archive_read"):
+            dates, columns = await asyncio.to_thread(self.archive.read_range, city.lower(), start, end)
+        logger.info("History: city=%s range=%s..%s days=%d", city, start, end, len(dates))
+        history = HistoryDTO(city=city, start=start.isoformat(), end=end.isoformat(), days=len(dates))
+        if not len(dates):
+            return history
+
+        temperature = columns["temperature"]
+        if np.isfinite(temperature).any():
+            history.aggregates = {
+                "temperature_min": float(np.nanmin(temperature)),
+                "temperature_max": float(np.nanmax(temperature)),
+                "temperature_mean": float(np.nanmean(temperature)),
+            }
+        if profile is not None:
+            age, height, weight, sex = profile
+            weather = np.column_stack([columns[field] for field in ARCHIVE_WEATHER_FIELDS])
+            values = ComfortService.comfort_series(weather, age, height, weight, sex)
+            scored = values[~np.isnan(values).any(axis=1)]
+            if len(scored):
+                history.comfort_mean = dict(zip(COMFORT_OUTPUTS, scored.mean(axis=0).tolist()))
+            history.comfort_daily = _nullable(values[:, -1])
+        if include_rows:
+            history.date = np.datetime_as_string(dates, unit="D").tolist()
+            history.columns = {field: values.tolist() for field, values in columns.items()}
+        return history
+
+    @staticmethod
+    def _comfort_from_block(
+        city_block: Dict[str, Dict[str, Any]],
+        age: float,
+        weight: float,
+        height: float,
+        sex: Sex,
+        city: str,
+        date_key: str
+    ) -> ComfortDTO:
+        if date_key not in city_block or _is_placeholder(city_block[date_key]):
             logger.error("Comfort lookup missed cache: city=%s date=%s; call /weather/forecast first", city, date_key)
             raise ValueError("No cached data for this city and date. Call /weather/forecast first.")
         logger.info("Computing comfort: city=%s date=%s", city, date_key)
-        return ComfortService().get_comfort(
-            weather_forecast=city_block[date_key],
-            age=age,
-            height=height,
-            weight=weight,
-            sex=sex
-        )
+        with STAGE_SECONDS.time(stage="comfort"):
+            return ComfortService().get_comfort(
+                weather_forecast=city_block[date_key],
+                age=age,
+                height=height,
+                weight=weight,
+                sex=sex
+            )
+
+    async def aget_comfort_batch(
+        self,
+        cities: Sequence[str],
+        dates: Sequence[datetime.date],
+        profiles: Sequence[Tuple[float, float, float, Sex]],
+    ) -> List[ComfortBatchItemDTO]:
+        date_keys = [d.isoformat() for d in dates]
+        blocks = await self._aload_many(list(dict.fromkeys(city.lower() for city in cities)), date_keys)
+
+        found = [(city, d) for city in cities for d in date_keys
+                 if d in blocks[city.lower()] and not _is_placeholder(blocks[city.lower()][d])]
+        CACHE_REQUESTS.inc(len(found), endpoint="comfort_batch", result="hit")
+        CACHE_REQUESTS.inc(len(cities) * len(date_keys) - len(found), endpoint="comfort_batch", result="miss")
+        with STAGE_SECONDS.time(stage="comfort_batch"):
+            results = ComfortService.get_comfort_batch(
+                [blocks[city.lower()][d] for city, d in found], profiles
+            )
+        by_key = dict(zip(found, results))
+        logger.info("Computed batch comfort: cities=%d dates=%d profiles=%d rows=%d",
+                    len(cities), len(date_keys), len(profiles), len(found))
+
+        out: List[ComfortBatchItemDTO] = []
+        for city in cities:
+            for d in date_keys:
+                row = by_key.get((city, d))
+                for i in range(len(profiles)):
+                    if row is None:
+                        out.append(ComfortBatchItemDTO(
+                            city=city, date=d, profile_index=i,
+                            error="No cached data for this city and date. Call /weather/forecast first."
+                        ))
+                    else:
+                        out.append(ComfortBatchItemDTO(city=city, date=d, profile_index=i, comfort=row[i]))
+        return out
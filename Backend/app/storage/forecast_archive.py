@@ -0,0 +1,177 @@
+import datetime
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker process is assumed
+    fcntl = None
+
+from app.storage.forecast_store import ROW_FIELDS, CityRows
+
+logger = logging.getLogger(__name__)
+
+DAY_FILE = "day.u1"
+LOCK_FILE = ".lock"
+DAY_DTYPE = np.uint8
+FIELD_DTYPE = np.float32
+
+Columns = Dict[str, np.ndarray]
+
+
+def _month_of(date: str) -> str:
+    return date[:7]
+
+
+def _month_bounds(month: str) -> Tuple[datetime.date, datetime.date]:
+    first = datetime.date.fromisoformat(f"{month}-01")
+    following = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return first, following - datetime.timedelta(days=1)
+
+
+def _city_dir(city_key: str) -> str:
+    # Dots are encoded too, so "." and ".." can never name the root or its parent.
+    return quote(city_key, safe="").replace(".", "%2E")
+
+
+def _open(path: Path, dtype: Any, count: int) -> np.ndarray:
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class ForecastArchive:
+    # <root>/<quoted city, dots encoded>/<YYYY-MM>/<field>.f4, one value per archived day; day.u1 holds the day of month
+    # and is written last, so its length is the number of complete rows in the partition.
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self.appended = 0
+
+    def _partition(self, city_key: str, month: str) -> Path:
+        return self.root / _city_dir(city_key) / month
+
+    @staticmethod
+    def _field_path(partition: Path, field: str) -> Path:
+        return partition / f"{field}.f4"
+
+    @staticmethod
+    def _count(partition: Path) -> int:
+        try:
+            return (partition / DAY_FILE).stat().st_size // np.dtype(DAY_DTYPE).itemsize
+        except FileNotFoundError:
+            return 0
+
+    def _repair(self, partition: Path, count: int) -> None:
+        # A crash between field appends leaves some files longer than day.u1; cut them back.
+        size = count * np.dtype(FIELD_DTYPE).itemsize
+        for field in ROW_FIELDS:
+            path = self._field_path(partition, field)
+            if path.exists() and path.stat().st_size != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        # Appends and repairs rewrite several files per partition; serialise them across threads and worker processes.
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / LOCK_FILE, "a+b") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def append(self, rows_by_city: Dict[str, CityRows]) -> int:
+        appended = 0
+        with self._writing():
+            for city_key, rows in rows_by_city.items():
+                if not city_key:
+                    logger.warning("Skipping %d forecast rows with an empty city key", len(rows))
+                    continue
+                by_month: Dict[str, List[Dict[str, Any]]] = {}
+                for date in sorted(rows):
+                    by_month.setdefault(_month_of(date), []).append(rows[date])
+                for month, month_rows in by_month.items():
+                    partition = self._partition(city_key, month)
+                    partition.mkdir(parents=True, exist_ok=True)
+                    self._repair(partition, self._count(partition))
+                    for field in ROW_FIELDS:
+                        values = np.array([row.get(field) for row in month_rows], dtype=float).astype(FIELD_DTYPE)
+                        with open(self._field_path(partition, field), "ab") as f:
+                            f.write(values.tobytes())
+                    days = np.array([int(str(row["date"])[8:10]) for row in month_rows], dtype=DAY_DTYPE)
+                    with open(partition / DAY_FILE, "ab") as f:
+                        f.write(days.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    appended += len(month_rows)
+            self.appended += appended
+        if appended:
+            logger.info("Archived %d forecast rows for %d cities", appended, len(rows_by_city))
+        return appended
+
+    def months(self, city_key: str) -> List[str]:
+        city_dir = self.root / _city_dir(city_key)
+        if not city_key or not city_dir.is_dir():
+            return []
+        return sorted(p.name for p in city_dir.iterdir() if p.is_dir())
+
+    def cities(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(unquote(p.name) for p in self.root.iterdir() if p.is_dir())
+
+    def _read_partition(self, partition: Path, first: int, last: int) -> Tuple[np.ndarray, Columns]:
+        count = self._count(partition)
+        day = _open(partition / DAY_FILE, DAY_DTYPE, count)
+        if count and np.all(day[1:] > day[:-1]):
+            # The usual case: days were archived in order, so the range is one contiguous slice.
+            lo, hi = np.searchsorted(day, [first, last + 1])
+            index: Any = slice(int(lo), int(hi))
+        else:
+            # Re-archived days: keep the latest copy of each.
+            reversed_days = day[::-1]
+            _, last_seen = np.unique(reversed_days, return_index=True)
+            index = np.sort(count - 1 - last_seen)
+            index = index[(day[index] >= first) & (day[index] <= last)]
+        columns = {field: np.array(_open(self._field_path(partition, field), FIELD_DTYPE, count)[index])
+                   for field in ROW_FIELDS}
+        return np.array(day[index]), columns
+
+    def iter_range(
+        self,
+        city_key: str,
+        start: datetime.date,
+        end: datetime.date,
+    ) -> Iterator[Tuple[np.ndarray, Columns]]:
+        for month in self.months(city_key):
+            month_first, month_last = _month_bounds(month)
+            if month_last < start or month_first > end:
+                continue
+            first = max(start, month_first).day
+            last = min(end, month_last).day
+            days, columns = self._read_partition(self._partition(city_key, month), first, last)
+            if len(days):
+                dates = np.datetime64(month, "D") + (days.astype(np.int64) - 1)
+                yield dates, columns
+
+    def read_range(self, city_key: str, start: datetime.date, end: datetime.date) -> Tuple[np.ndarray, Columns]:
+        parts = list(self.iter_range(city_key, start, end))
+        if not parts:
+            return np.empty(0, dtype="datetime64[D]"), {field: np.empty(0, dtype=FIELD_DTYPE) for field in ROW_FIELDS}
+        dates = np.concatenate([d for d, _ in parts])
+        return dates, {field: np.concatenate([c[field] for _, c in parts]) for field in ROW_FIELDS}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"root": str(self.root), "appended": self.appended}
@@ -0,0 +1,26 @@
+import argparse
+import logging
+
+from app.storage.sqlite_store import SqliteForecastStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import/export the forecast store as weather_forecast.json")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("json_path")
+    parser.add_argument("--db", default="weather_forecast.sqlite3")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    store = SqliteForecastStore(args.db)
+    try:
+        if args.command == "import":
+            store.import_json(args.json_path)
+        else:
+            store.export_json(args.json_path)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
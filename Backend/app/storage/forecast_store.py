@@ -0,0 +1,88 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROW_FIELDS = (
+    "humidity",
+    "temperature",
+    "windspeed",
+    "percipitation_probability",
+    "uv_index",
+    "cloudcover",
+    "aod",
+)
+
+CityRows = Dict[str, Dict[str, Any]]
+
+
+class ForecastStore(ABC):
+    @abstractmethod
+    def get_rows(self, city_key: str, dates: Iterable[str]) -> CityRows:
+        ...
+
+    @abstractmethod
+    def get_many(self, city_keys: Iterable[str], dates: Iterable[str]) -> Dict[str, CityRows]:
+        ...
+
+    @abstractmethod
+    def upsert_rows(self, rows_by_city: Dict[str, CityRows]) -> int:
+        ...
+
+    @abstractmethod
+    def evict_before(self, date: str) -> int:
+        ...
+
+    @abstractmethod
+    def iter_rows(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        ...
+
+    def drain_before(self, date: str, sink: Callable[[Dict[str, CityRows]], Any]) -> int:
+        # Hands the rows older than date to sink, then evicts them. Stores shared between processes override this
+        # so exactly one of them drains a given row.
+        out: Dict[str, CityRows] = {}
+        for city_key, row in self.iter_rows():
+            if row["date"] < date:
+                out.setdefault(city_key, {})[row["date"]] = row
+        if out:
+            sink(out)
+        return self.evict_before(date)
+
+    def is_empty(self) -> bool:
+        return next(self.iter_rows(), None) is None
+
+    def close(self) -> None:
+        pass
+
+    def import_json(self, path: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: expected an object keyed by city")
+        rows_by_city: Dict[str, CityRows] = {}
+        for city_key, block in data.items():
+            if not isinstance(block, dict):
+                continue
+            rows_by_city[str(city_key).lower()] = {
+                str(d): dict(row, date=str(d)) for d, row in block.items() if isinstance(row, dict)
+            }
+        count = self.upsert_rows(rows_by_city)
+        logger.info("Imported %d forecast rows from %s", count, path)
+        return count
+
+    def export_json(self, path: str) -> int:
+        data: Dict[str, CityRows] = {}
+        count = 0
+        for city_key, row in self.iter_rows():
+            data.setdefault(city_key, {})[row["date"]] = row
+            count += 1
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        logger.info("Exported %d forecast rows to %s", count, path)
+        return count
+
+
+def row_values(city_key: str, row: Dict[str, Any]) -> List[Any]:
+    return [city_key, str(row.get("date") or "")] + [row.get(k) for k in ROW_FIELDS]
@@ -0,0 +1,141 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from app.storage.forecast_store import ROW_FIELDS, CityRows, ForecastStore, row_values
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("city", "date") + ROW_FIELDS + ("updated_at",)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecast (
+    city TEXT NOT NULL,
+    date TEXT NOT NULL,
+    humidity REAL,
+    temperature REAL,
+    windspeed REAL,
+    percipitation_probability REAL,
+    uv_index INTEGER,
+    cloudcover REAL,
+    aod REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (city, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS forecast_date_idx ON forecast (date);
+"""
+
+_UPSERT = (
+    f"INSERT INTO forecast ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+    f"ON CONFLICT (city, date) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in ROW_FIELDS)
+    + ", updated_at = excluded.updated_at"
+)
+
+
+def connect_wal(path: str, busy_timeout_ms: int = 5000) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class SqliteForecastStore(ForecastStore):
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_wal(self.path, self.busy_timeout_ms)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _to_row(rec: sqlite3.Row) -> Dict[str, Any]:
+        row = {"date": rec["date"]}
+        for k in ROW_FIELDS:
+            row[k] = rec[k]
+        row["updated_at"] = rec["updated_at"]
+        return row
+
+    def get_rows(self, city_key: str, dates: Iterable[str]) -> CityRows:
+        return self.get_many([city_key], dates).get(city_key, {})
+
+    def get_many(self, city_keys: Iterable[str], dates: Iterable[str]) -> Dict[str, CityRows]:
+        cities = list(dict.fromkeys(city_keys))
+        days = list(dict.fromkeys(dates))
+        if not cities or not days:
+            return {}
+        sql = (
+            f"SELECT * FROM forecast WHERE city IN ({', '.join('?' * len(cities))}) "
+            f"AND date IN ({', '.join('?' * len(days))})"
+        )
+        out: Dict[str, CityRows] = {}
+        for rec in self._conn().execute(sql, cities + days):
+            out.setdefault(rec["city"], {})[rec["date"]] = self._to_row(rec)
+        return out
+
+    def upsert_rows(self, rows_by_city: Dict[str, CityRows]) -> int:
+        now = time.time()
+        values = [row_values(city_key, row) + [now] for city_key, rows in rows_by_city.items() for row in rows.values()]
+        if not values:
+            return 0
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(_UPSERT, values)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(values)
+
+    def drain_before(self, date: str, sink: Callable[[Dict[str, CityRows]], Any]) -> int:
+        # Read, hand off and delete under one write lock: other workers block here and then find nothing left.
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            out: Dict[str, CityRows] = {}
+            for rec in conn.execute("SELECT * FROM forecast WHERE date < ? ORDER BY city, date", (date,)):
+                out.setdefault(rec["city"], {})[rec["date"]] = self._to_row(rec)
+            if out:
+                sink(out)
+            cur = conn.execute("DELETE FROM forecast WHERE date < ?", (date,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if cur.rowcount:
+            logger.info("Evicted %d forecast rows older than %s", cur.rowcount, date)
+        return cur.rowcount
+
+    def evict_before(self, date: str) -> int:
+        cur = self._conn().execute("DELETE FROM forecast WHERE date < ?", (date,))
+        if cur.rowcount:
+            logger.info("Evicted %d forecast rows older than %s", cur.rowcount, date)
+        return cur.rowcount
+
+    def iter_rows(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for rec in self._conn().execute("SELECT * FROM forecast ORDER BY city, date"):
+            yield rec["city"], self._to_row(rec)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
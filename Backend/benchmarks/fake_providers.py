@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import hashlib
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "50"))
+JITTER_MS = float(os.getenv("FAKE_JITTER_MS", "10"))
+FAILURE_RATE = float(os.getenv("FAKE_FAILURE_RATE", "0"))
+ONECALL_V3_STATUS = int(os.getenv("FAKE_ONECALL_V3_STATUS", "401"))
+
+app = FastAPI(title="Fake weather providers")
+COUNTS: Dict[str, int] = {}
+
+
+async def _upstream(name: str) -> Optional[JSONResponse]:
+    COUNTS[name] = COUNTS.get(name, 0) + 1
+    delay = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000.0
+    if delay:
+        await asyncio.sleep(delay)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        COUNTS[name + "_failed"] = COUNTS.get(name + "_failed", 0) + 1
+        return JSONResponse({"error": True, "reason": "injected failure"}, status_code=500)
+    return None
+
+
+def _coords(city: str) -> Dict[str, float]:
+    h = int(hashlib.sha1(city.strip().lower().encode("utf-8")).hexdigest()[:8], 16)
+    return {"lat": round(-60 + (h % 12000) / 100, 4), "lon": round(-180 + (h // 12000 % 36000) / 100, 4)}
+
+
+def _days(params: Dict[str, str], default_days: int) -> List[str]:
+    if "start_date" in params and "end_date" in params:
+        start = datetime.date.fromisoformat(params["start_date"])
+        n = (datetime.date.fromisoformat(params["end_date"]) - start).days + 1
+    else:
+        start = datetime.date.today()
+        n = int(params.get("forecast_days", default_days))
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(n)]
+
+
+def _per_location(params: Dict[str, str], build) -> Any:
+    lats = params["latitude"].split(",")
+    items = [build(float(lat)) for lat in lats]
+    return items[0] if len(items) == 1 else items
+
+
+@app.get("/openmeteo/geocode")
+async def openmeteo_geocode(name: str):
+    failed = await _upstream("openmeteo_geocode")
+    if failed:
+        return failed
+    c = _coords(name)
+    return {"results": [{"name": name, "latitude": c["lat"], "longitude": c["lon"], "timezone": "Europe/Kyiv"}]}
+
+
+@app.get("/openmeteo/forecast")
+async def openmeteo_forecast(request: Request):
+    failed = await _upstream("openmeteo_forecast")
+    if failed:
+        return failed
+    params = dict(request.query_params)
+    days = _days(params, 7)
+    n = len(days)
+
+    def build(lat: float) -> Dict[str, Any]:
+        base = 15 + lat / 10
+        return {
+            "latitude": lat,
+            "timezone": "Europe/Kyiv",
+            "daily": {
+                "time": days,
+                "temperature_2m_mean": [round(base + i * 0.5, 1) for i in range(n)],
+                "relative_humidity_2m_mean": [60 + i for i in range(n)],
+                "uv_index_max": [3.5] * n,
+                "precipitation_probability_max": [20] * n,
+                "wind_speed_10m_max": [4.2] * n,
+                "cloud_cover_mean": [45] * n,
+            },
+        }
+
+    return _per_location(params, build)
+
+
+@app.get("/openmeteo/air-quality")
+async def openmeteo_air_quality(request: Request):
+    failed = await _upstream("openmeteo_air_quality")
+    if failed:
+        return failed
+    params = dict(request.query_params)
+    hours = [f"{d}T{h:02d}:00" for d in _days(params, 5) for h in range(24)]
+
+    def build(lat: float) -> Dict[str, Any]:
+        return {"latitude": lat, "hourly": {"time": hours, "aerosol_optical_depth": [0.25] * len(hours)}}
+
+    return _per_location(params, build)
+
+
+@app.get("/openweather/geocode")
+async def openweather_geocode(q: str):
+    failed = await _upstream("openweather_geocode")
+    if failed:
+        return failed
+    c = _coords(q)
+    return [{"name": q, "lat": c["lat"], "lon": c["lon"]}]
+
+
+@app.get("/openweather/onecall/3.0")
+async def openweather_onecall_v3():
+    failed = await _upstream("openweather_onecall_v3")
+    if failed:
+        return failed
+    if ONECALL_V3_STATUS != 200:
+        return JSONResponse({"cod": ONECALL_V3_STATUS, "message": "fake"}, status_code=ONECALL_V3_STATUS)
+    return _onecall()
+
+
+@app.get("/openweather/onecall/2.5")
+async def openweather_onecall_v25():
+    failed = await _upstream("openweather_onecall_v25")
+    if failed:
+        return failed
+    return _onecall()
+
+
+def _onecall() -> Dict[str, Any]:
+    now = int(time.time())
+    return {
+        "timezone_offset": 10800,
+        "daily": [
+            {"dt": now + 86400 * i, "temp": {"day": 14.0 + i}, "humidity": 62, "wind_speed": 3.1,
+             "pop": 0.2, "uvi": 3.2, "clouds": 40}
+            for i in range(8)
+        ],
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return COUNTS
+
+
+def provider_env(base_url: str) -> Dict[str, str]:
+    return {
+        "OPENMETEO_GEO_URL": f"{base_url}/openmeteo/geocode",
+        "OPENMETEO_FORECAST_URL": f"{base_url}/openmeteo/forecast",
+        "OPENMETEO_AIR_QUALITY_URL": f"{base_url}/openmeteo/air-quality",
+        "OPENWEATHER_GEO_URL": f"{base_url}/openweather/geocode",
+        "OPENWEATHER_ONECALL_URLS": f"{base_url}/openweather/onecall/3.0,{base_url}/openweather/onecall/2.5",
+    }
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.fake_providers import provider_env  # noqa: E402
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+PROFILES = [(age, height, weight, sex) for age in (18, 30, 45, 70) for height, weight in ((160, 55), (175, 72), (190, 95))
+            for sex in ("male", "female")]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(module: str, port: int, env: Dict[str, str], cwd: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(BACKEND_DIR), **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+UNIT_SCALE = {"ms": 1e3, "us": 1e6}
+
+
+def _summary(latencies: Sequence[float], errors: int, elapsed: float, unit: str = "ms") -> Dict[str, float]:
+    values = np.asarray(latencies) * UNIT_SCALE[unit]
+    summary: Dict[str, float] = {"requests": len(latencies), "errors": errors}
+    for q in (50, 95, 99):
+        summary[f"p{q}_{unit}"] = round(float(np.percentile(values, q)), 3) if len(values) else 0.0
+    summary["rps"] = round(len(latencies) / elapsed, 1) if elapsed else 0.0
+    return summary
+
+
+async def _load(client: httpx.AsyncClient, paths: Sequence[str], concurrency: int) -> Dict[str, float]:
+    queue = list(reversed(paths))
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while queue:
+            path = queue.pop()
+            t = time.perf_counter()
+            try:
+                r = await client.get(path)
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - t)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return _summary(latencies, errors, time.perf_counter() - started)
+
+
+def _comfort_path(city: str, profile) -> str:
+    age, height, weight, sex = profile
+    return f"/weather/comfort?city={city}&age={age}&height={height}&weight={weight}&sex={sex}"
+
+
+def _seed_rollover(db_path: str, cities: Sequence[str]) -> None:
+    # Rows for today..today+4 only: the first request for each city must fetch just the new sixth day.
+    from app.storage.sqlite_store import SqliteForecastStore
+    today = datetime.date.today()
+    rows = {}
+    for city in cities:
+        rows[city.lower()] = {
+            (today + datetime.timedelta(days=i)).isoformat(): {
+                "date": (today + datetime.timedelta(days=i)).isoformat(), "humidity": 60.0, "temperature": 15.0,
+                "windspeed": 4.0, "percipitation_probability": 20.0, "uv_index": 3, "cloudcover": 45.0, "aod": 0.25,
+            }
+            for i in range(5)
+        }
+    store = SqliteForecastStore(db_path)
+    store.upsert_rows(rows)
+    store.close()
+
+
+async def _http_scenarios(base_url: str, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    n, concurrency = args.requests, args.concurrency
+    hot = [f"bench-hot-{i}" for i in range(20)]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        await _load(client, [f"/weather/forecast?city={city}" for city in hot], concurrency)
+        rng = random.Random(42)
+        results = {
+            "forecast_hit": await _load(client, [f"/weather/forecast?city={hot[i % len(hot)]}" for i in range(n)],
+                                        concurrency),
+            "forecast_miss": await _load(client, [f"/weather/forecast?city=bench-miss-{i}" for i in range(n)],
+                                         concurrency),
+            "forecast_rollover": await _load(
+                client, [f"/weather/forecast?city=bench-rollover-{i}" for i in range(args.rollover_cities)],
+                concurrency),
+            "comfort": await _load(client, [_comfort_path(rng.choice(hot), rng.choice(PROFILES)) for _ in range(n)],
+                                   concurrency),
+        }
+    return results
+
+
+def _time_calls(fn: Callable[[], Any], calls: int) -> Dict[str, float]:
+    for _ in range(min(calls, 1000)):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(calls):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return _summary(latencies, 0, time.perf_counter() - started, unit="us")
+
+
+def _micro_benchmarks(calls: int) -> Dict[str, Dict[str, float]]:
+    from app.services.comfort_model import COMFORT_FORMULAS
+    from app.services.comfort_service import ComfortService, Metrics, Sex, get_comfort_model
+
+    row = {"temperature": 18.5, "humidity": 64.0, "windspeed": 3.2, "uv_index": 4, "aod": 0.21}
+    formulas = get_comfort_model().config["formulas"]
+    name = COMFORT_FORMULAS[0][1]
+    scaling = formulas[name]["scaling_params"]
+    values = {"temperature": 18.5, "humidity": 64.0, "wind_speed": 3.2, "UVA": 4.0, "AOD": 0.21,
+              "sex": 1.0, "age": 30.0, "height": 175.0, "weight": 72.0, "BMI": 23.5}
+    metrics = {k: Metrics(v, scaling[k]["mean"], scaling[k]["std"], 0.0) for k, v in values.items()}
+    return {
+        "comfort_calculation": _time_calls(lambda: ComfortService.calculation(metrics, name), calls),
+        "comfort_get_comfort": _time_calls(
+            lambda: ComfortService.get_comfort(row, age=30, height=175, weight=72, sex=Sex.male), calls),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="weather-bench-")
+    fake_port, app_port = _free_port(), _free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    db_path = os.path.join(workdir, "forecast.sqlite3")
+    _seed_rollover(db_path, [f"bench-rollover-{i}" for i in range(args.rollover_cities)])
+
+    fake = _start("benchmarks.fake_providers:app", fake_port, {
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_JITTER_MS": str(args.jitter_ms),
+        "FAKE_FAILURE_RATE": str(args.failure_rate),
+    }, workdir)
+    server = _start("app.main:app", app_port, {
+        **provider_env(fake_url),
+        "OPENWEATHER_API_KEY": "bench",
+        "WEATHER_DB_PATH": db_path,
+        "WEATHER_CACHE_FILE": os.path.join(workdir, "legacy.json"),
+        "GEOCODE_DB_PATH": os.path.join(workdir, "geocode.sqlite3"),
+        "PREFETCH_ENABLED": "0",
+        # Measure the service itself, not the free-tier quotas it enforces against real providers.
+        "OPENMETEO_RATE_LIMIT_PER_MINUTE": "0",
+        "OPENMETEO_RATE_LIMIT_PER_DAY": "0",
+        "OPENWEATHER_RATE_LIMIT_PER_MINUTE": "0",
+        "OPENWEATHER_RATE_LIMIT_PER_DAY": "0",
+    }, workdir)
+    try:
+        _wait_ready(f"{fake_url}/stats")
+        _wait_ready(f"{app_url}/")
+        results = asyncio.run(_http_scenarios(app_url, args))
+        results["upstream_calls"] = httpx.get(f"{fake_url}/stats").json()
+    finally:
+        for proc in (server, fake):
+            proc.terminate()
+            proc.wait(timeout=10)
+    results.update(_micro_benchmarks(args.micro_calls))
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    failures = []
+    for name, expected in baseline.get("scenarios", {}).items():
+        actual = results.get(name)
+        if actual is None:
+            failures.append(f"{name}: missing from results")
+            continue
+        for key, limit in expected.items():
+            value = actual.get(key)
+            if value is None:
+                continue
+            if key in ("rps",) and value < limit * (1 - tolerance):
+                failures.append(f"{name}.{key}: {value} < baseline {limit} (-{tolerance:.0%})")
+            elif key.startswith("p") and value > limit * (1 + tolerance):
+                failures.append(f"{name}.{key}: {value} > baseline {limit} (+{tolerance:.0%})")
+            elif key == "errors" and value > limit:
+                failures.append(f"{name}.{key}: {value} > baseline {limit}")
+    return failures
+
+
+def _print_table(results: Dict[str, Any]) -> None:
+    print(f"{'scenario':<22}{'n':>7}{'err':>6}{'p50':>11}{'p95':>11}{'p99':>11}{'rps':>11}")
+    for name, r in results.items():
+        if "requests" not in r:
+            continue
+        unit = "us" if "p50_us" in r else "ms"
+        print(f"{name:<22}{r['requests']:>7}{r['errors']:>6}"
+              f"{r[f'p50_{unit}']:>9}{unit}{r[f'p95_{unit}']:>9}{unit}{r[f'p99_{unit}']:>9}{unit}{r['rps']:>11}")
+    if "upstream_calls" in results:
+        print("upstream calls:", json.dumps(results["upstream_calls"], sort_keys=True))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmarks against fake weather providers.")
+    parser.add_argument("--requests", type=int, default=300, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rollover-cities", type=int, default=100)
+    parser.add_argument("--micro-calls", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="injected upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of upstream calls that return 500")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown before failing")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", type=Path, help="write raw results as JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    _print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.update_baseline:
+        scenarios = {
+            name: {k: v for k, v in r.items() if k in ("p50_ms", "p95_ms", "p50_us", "p95_us", "rps", "errors")}
+            for name, r in results.items() if "requests" in r
+        }
+        args.baseline.write_text(json.dumps({"scenarios": scenarios}, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return
+    failures = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+    if failures:
+        print("\nPERFORMANCE REGRESSION:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()